@@ -6,6 +6,7 @@
 # Summaries: tax_geo_inst_summaries.jsonl, country_summaries.jsonl. institution_summaries.jsonl
 #            sequence_run_site_summaries.jsonl, bin_summaries.jsonl, dataset_summaries.jsonl
 #            primer_summaries.jsonl, taxonomy_summaries.jsonl
+# Indexes: processid_records.jsonl
 # Terms: accepted_terms_combined.jsonl
 # Registries: bold_dataset_registry.jsonl, bold_barcodecluster_registry.jsonl, bold_geopol_registry.jsonl
 #             bold_institution_registry.jsonl, bold_primer_registry.jsonl, bold_taxonomy_registry.jsonl
@@ -30,6 +31,7 @@ python src/ETL/couchbase-tools/bulk_load_documents.py --bucket DERIVED --collect
 python src/ETL/couchbase-tools/bulk_load_documents.py --bucket DERIVED --collection dataset_summaries --endpoint $COUCHBASE_ENDPOINT --username $COUCHBASE_USER --password $COUCHBASE_PASSWORD --primary-key 'dataset.code' --file $WORKING_DIR/dataset_summaries.jsonl
 python src/ETL/couchbase-tools/bulk_load_documents.py --bucket DERIVED --collection primer_summaries --endpoint $COUCHBASE_ENDPOINT --username $COUCHBASE_USER --password $COUCHBASE_PASSWORD --primary-key 'name' --file $WORKING_DIR/primer_summaries.jsonl
 python src/ETL/couchbase-tools/bulk_load_documents.py --bucket DERIVED --collection taxonomy_summaries --endpoint $COUCHBASE_ENDPOINT --username $COUCHBASE_USER --password $COUCHBASE_PASSWORD --primary-key 'taxid' --file $WORKING_DIR/taxonomy_summaries.jsonl
+python src/ETL/couchbase-tools/bulk_load_documents.py --bucket DERIVED --collection processid_records --endpoint $COUCHBASE_ENDPOINT --username $COUCHBASE_USER --password $COUCHBASE_PASSWORD --primary-key 'processid' --file $WORKING_DIR/processid_records.jsonl
 python src/ETL/couchbase-tools/bulk_load_documents.py --bucket DERIVED --collection accepted_terms --endpoint $COUCHBASE_ENDPOINT --username $COUCHBASE_USER --password $COUCHBASE_PASSWORD --primary-key 'term' --file $WORKING_DIR/accepted_terms_combined.jsonl
 
 # Step 4: Load ancillary documents
@@ -2,3 +2,6 @@
 
 DROP COLLECTION `DERIVED`.`_default`.`taxonomy_summaries` IF EXISTS;
 CREATE COLLECTION `DERIVED`.`_default`.`taxonomy_summaries` IF NOT EXISTS;
+
+DROP COLLECTION `DERIVED`.`_default`.`processid_records` IF EXISTS;
+CREATE COLLECTION `DERIVED`.`_default`.`processid_records` IF NOT EXISTS;
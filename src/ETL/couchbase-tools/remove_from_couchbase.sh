@@ -7,6 +7,7 @@
 #                      institution_summaries_deletions.txt, sequence_run_site_summaries_deletions.txt,
 #                      bin_summaries_deletions.txt, dataset_summaries_deletions.txt,
 #                      primer_summaries_deletions.txt, taxonomy_summaries_deletions.txt
+# Indexes Deletions: processid_records_deletions.txt
 # Terms Deletions: accepted_terms_deletions.txt
 # Registries Deletions: datasets_deletions.txt, barcodeclusters_deletions.txt,
 #                       countries_deletions.txt, institutions_deletions.txt,
@@ -29,6 +30,7 @@ python src/ETL/couchbase-tools/bulk_remove_documents.py --bucket DERIVED --colle
 python src/ETL/couchbase-tools/bulk_remove_documents.py --bucket DERIVED --collection dataset_summaries --endpoint $COUCHBASE_ENDPOINT --username $COUCHBASE_USER --password $COUCHBASE_PASSWORD --file $WORKING_DIR/dataset_summaries_deletions.txt
 python src/ETL/couchbase-tools/bulk_remove_documents.py --bucket DERIVED --collection primer_summaries --endpoint $COUCHBASE_ENDPOINT --username $COUCHBASE_USER --password $COUCHBASE_PASSWORD --file $WORKING_DIR/primer_summaries_deletions.txt
 python src/ETL/couchbase-tools/bulk_remove_documents.py --bucket DERIVED --collection taxonomy_summaries --endpoint $COUCHBASE_ENDPOINT --username $COUCHBASE_USER --password $COUCHBASE_PASSWORD --file $WORKING_DIR/taxonomy_summaries_deletions.txt
+python src/ETL/couchbase-tools/bulk_remove_documents.py --bucket DERIVED --collection processid_records --endpoint $COUCHBASE_ENDPOINT --username $COUCHBASE_USER --password $COUCHBASE_PASSWORD --file $WORKING_DIR/processid_records_deletions.txt
 
 # 3: Remove ANCILLARY documents
 python src/ETL/couchbase-tools/bulk_remove_documents.py --bucket ANCILLARY --collection datasets --endpoint $COUCHBASE_ENDPOINT --username $COUCHBASE_USER --password $COUCHBASE_PASSWORD --file $WORKING_DIR/datasets_deletions.txt
@@ -6,6 +6,7 @@
 # Summaries: tax_geo_inst_summaries.jsonl, country_summaries.jsonl. institution_summaries.jsonl
 #            sequence_run_site_summaries.jsonl, bin_summaries.jsonl, dataset_summaries.jsonl
 #            primer_summaries.jsonl, taxonomy_summaries.jsonl
+# Indexes: processid_records.jsonl
 # Terms: accepted_terms_combined.jsonl
 # Registries: bold_dataset_registry.jsonl, bold_barcodecluster_registry.jsonl, bold_geopol_registry.jsonl
 #             bold_institution_registry.jsonl, bold_primer_registry.jsonl, bold_taxonomy_registry.jsonl
@@ -36,6 +37,7 @@ bin_summaries:bin_uri:bin_summaries.jsonl
 dataset_summaries:dataset.code:dataset_summaries.jsonl
 primer_summaries:name:primer_summaries.jsonl
 taxonomy_summaries:taxid:taxonomy_summaries.jsonl
+processid_records:processid:processid_records.jsonl
 "
 
 for D in $DERIVED
@@ -0,0 +1,41 @@
+import sys
+import ujson as json
+import argparse
+import traceback
+
+
+INDEX_KEY = "processid"  # this is what we will index by
+RECORD_KEY = "record_id"
+
+
+def main(args):
+    index = {}
+
+    try:
+        for jline in sys.stdin:
+            record = json.loads(jline)
+            if INDEX_KEY not in record or RECORD_KEY not in record:
+                continue
+
+            # one processid maps to a record per marker, e.g. GMFID492-12.COI-5P
+            index.setdefault(record[INDEX_KEY], set()).add(record[RECORD_KEY])
+
+        # write index to file - one per processid, record_ids sorted like query caches
+        with open(args.index_file, "w") as f:
+            for processid, record_ids in index.items():
+                f.write(
+                    json.dumps({INDEX_KEY: processid, "record_ids": sorted(record_ids)})
+                    + "\n"
+                )
+
+    except Exception as e:
+        print("Error", e)
+        print(traceback.format_exc())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index_file", type=str)
+    args = parser.parse_args()
+
+    main(args)
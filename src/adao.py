@@ -0,0 +1,435 @@
+import asyncio
+import datetime
+import hashlib
+import logging
+import time
+import ujson
+import uuid
+
+from acouchbase.cluster import Cluster
+from couchbase.exceptions import (
+    AmbiguousTimeoutException,
+    CollectionNotFoundException,
+    DocumentNotFoundException,
+    UnAmbiguousTimeoutException,
+)
+from couchbase.options import GetOptions
+
+import dao
+import util
+
+query_logger = logging.getLogger("query_logger")
+
+# Asyncio counterpart of dao.py, sharing its statement builders. The cluster must be
+# created inside the running event loop, so it is connected lazily (or from the app
+# lifespan) rather than at import like the synchronous cluster
+_CB_CLUSTER = None
+_CB_CLUSTER_LOCK = asyncio.Lock()
+_CB_BUCKETS = {}
+_CB_INDEX_TIMEOUT = 1  # Seconds before a processid index lookup is treated as a miss
+
+# Single-flight: identical queries in flight share one execution, within a worker via
+# a shared task and across workers via a Redis lock. The leader extends a short lock
+# lease while its query runs, and caches its result only when other workers wait on it.
+# Redis calls and result (de)serialisation run in threads to keep the event loop free
+_IN_FLIGHT = {}
+_SINGLE_FLIGHT_LEASE = 30  # Seconds the lock outlives a stalled leader
+_SINGLE_FLIGHT_POLL = 0.05  # Seconds between checks on another worker's query
+_SINGLE_FLIGHT_MAX_ROWS = 100000  # Larger results are not shared across workers
+
+###
+# Couchbase DAO
+###
+
+
+async def _get_cb_cluster():
+    global _CB_CLUSTER
+
+    if _CB_CLUSTER is None:
+        async with _CB_CLUSTER_LOCK:
+            if _CB_CLUSTER is None:
+                cluster = await Cluster.connect(dao._CB_ENDPOINT, dao._CB_OPTIONS)
+                await cluster.wait_until_ready(datetime.timedelta(seconds=5))
+                _CB_CLUSTER = cluster
+
+    return _CB_CLUSTER
+
+
+async def _get_cb_bucket(bucket_name):
+    if (bucket := _CB_BUCKETS.get(bucket_name)) is None:
+        cluster = await _get_cb_cluster()
+        bucket = cluster.bucket(bucket_name)
+        await bucket.on_connect()
+        _CB_BUCKETS[bucket_name] = bucket
+
+    return bucket
+
+
+async def connect_cb_cluster():
+    await _get_cb_cluster()
+
+
+async def close_cb_cluster():
+    global _CB_CLUSTER
+
+    if _CB_CLUSTER is not None:
+        await _CB_CLUSTER.close()
+        _CB_CLUSTER = None
+        _CB_BUCKETS.clear()
+
+
+async def _extend_single_flight_lock(lock):
+    while True:
+        await asyncio.sleep(_SINGLE_FLIGHT_LEASE / 3)
+        await asyncio.to_thread(util.extend_single_flight_lock, lock)
+
+
+def _share_single_flight_rows(key, rows):
+    if len(rows) <= _SINGLE_FLIGHT_MAX_ROWS and util.pop_single_flight_waiters(key):
+        util.write_cache_with_meta_ids(
+            {util.generate_single_flight_meta_id(key): ujson.dumps(rows, default=str)},
+            util._SINGLE_FLIGHT_TTL,
+        )
+
+
+def _get_single_flight_rows(key):
+    meta_id = util.generate_single_flight_meta_id(key)
+    if (rows := util.get_cache_from_meta_ids([meta_id])[0]) is not None:
+        return ujson.loads(rows)
+
+    return None
+
+
+async def _single_flight_across_workers(key, execute):
+    lock, acquired = await asyncio.to_thread(
+        util.acquire_single_flight_lock, key, _SINGLE_FLIGHT_LEASE
+    )
+
+    if acquired:
+        lease = None
+        if lock is not None:
+            lease = asyncio.create_task(_extend_single_flight_lock(lock))
+
+        try:
+            rows = await execute()
+            if lock is not None:
+                await asyncio.to_thread(_share_single_flight_rows, key, rows)
+            return rows
+        finally:
+            if lease is not None:
+                lease.cancel()
+            await asyncio.to_thread(util.release_single_flight_lock, lock)
+
+    # Waits as long as the leader's query may run, the lease expiring if it died
+    await asyncio.to_thread(util.add_single_flight_waiter, key, dao._CB_TIMEOUT)
+    deadline = time.monotonic() + dao._CB_TIMEOUT
+    while time.monotonic() < deadline and await asyncio.to_thread(
+        util.is_single_flight_locked, lock
+    ):
+        await asyncio.sleep(_SINGLE_FLIGHT_POLL)
+
+    if (rows := await asyncio.to_thread(_get_single_flight_rows, key)) is not None:
+        return rows
+
+    return await execute()
+
+
+async def _single_flight(name, query, params, execute):
+    key = hashlib.sha1(
+        f"{name}|{query}|{ujson.dumps(params, sort_keys=True)}".encode()
+    ).hexdigest()
+
+    if (task := _IN_FLIGHT.get(key)) is None:
+        task = asyncio.create_task(_single_flight_across_workers(key, execute))
+        _IN_FLIGHT[key] = task
+        task.add_done_callback(lambda _: _IN_FLIGHT.pop(key, None))
+
+    # Shielded so one caller disconnecting does not cancel the others' query
+    return list(await asyncio.shield(task))
+
+
+async def _query_rows(name, query, params=None, log_params=""):
+    query = dao._prepare_statement(query)
+
+    return await _single_flight(
+        name,
+        query,
+        params,
+        lambda: _execute_query_rows(name, query, params, log_params),
+    )
+
+
+async def _execute_query_rows(name, query, params=None, log_params=""):
+    query_uuid = uuid.uuid4()
+    query_logger.info(f"Start {name} - UUID: {query_uuid} {query} {log_params}")
+
+    start_time = time.perf_counter()
+
+    cluster = await _get_cb_cluster()
+    results = cluster.query(query, dao._query_options(params))
+
+    rows = []
+    async for row in results.rows():
+        rows.append(row)
+
+    end_time = time.perf_counter()
+
+    query_logger.info(
+        f"End {name} - UUID: {query_uuid} {query} {log_params} {results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
+    )
+
+    return rows
+
+
+async def get_cb_meta_ids(triplets, bucket, collection):
+    query, params = dao._meta_ids_query(triplets, bucket, collection)
+    rows = await _query_rows("get_cb_meta_ids", query, params, ujson.dumps(params))
+
+    meta_ids = []
+    for meta_id in rows:
+        meta_ids.append(meta_id["id"])
+
+    return meta_ids
+
+
+async def get_cb_field_values(triplets, fields, bucket, collection, limit=None):
+    if not fields:
+        return []
+
+    query, params = dao._field_values_query(triplets, fields, bucket, collection, limit)
+    return await _query_rows("get_cb_field_values", query, params, ujson.dumps(params))
+
+
+async def _query_rows_concurrently(name, queries, params):
+    results = await asyncio.gather(
+        *[_query_rows(name, query, params, ujson.dumps(params)) for query in queries]
+    )
+    return [row for rows in results for row in rows]
+
+
+async def get_cb_group_by_field_documents(triplets, fields, bucket, collection):
+    if not fields:
+        return []
+
+    queries, params = dao._group_by_field_counts_queries(
+        triplets, fields, bucket, collection
+    )
+    return await _query_rows_concurrently(
+        "get_cb_group_by_field_documents", queries, params
+    )
+
+
+async def get_cb_distinct_counts(triplets, fields, bucket, collection):
+    if not fields:
+        return {}
+
+    query, params = dao._distinct_counts_query(triplets, fields, bucket, collection)
+    rows = await _query_rows(
+        "get_cb_distinct_counts", query, params, ujson.dumps(params)
+    )
+
+    return rows[0] if rows else {}
+
+
+async def get_cb_documents(meta_ids, bucket, collection):
+    query_uuid = uuid.uuid4()
+    query_logger.info(
+        f"Start get_cb_documents - UUID: {query_uuid} {len(meta_ids)} meta_id(s) "
+    )
+
+    start_time = time.perf_counter()
+
+    bucket = await _get_cb_bucket(bucket)
+    scope = bucket.scope("_default")
+    collection = scope.collection(collection)
+
+    # The asyncio SDK has no get_multi, so the individual gets are issued concurrently
+    # TODO: Attempt to recover documents that failed to fetch?
+    options = GetOptions(timeout=datetime.timedelta(seconds=dao._CB_TIMEOUT))
+    docs = await asyncio.gather(
+        *[collection.get(meta_id, options) for meta_id in meta_ids]
+    )
+    results = [doc.content_as[dict] for doc in docs]
+
+    end_time = time.perf_counter()
+
+    query_logger.info(
+        f"End get_cb_documents - UUID: {query_uuid} {len(results)} result(s) {end_time - start_time}"
+    )
+
+    return results
+
+
+async def get_cb_record_ids(processid):
+    # Keys of a processid's records from the index maintained by the ETL, or None if
+    # the processid (or the index collection itself) is not there yet. The SDK retries
+    # gets on a missing collection until they time out, so the timeout is kept short
+    index = dao.NAME_MAP["processid_index"]
+    bucket = await _get_cb_bucket(index["bucket"])
+    collection = bucket.scope("_default").collection(index["collection"])
+
+    try:
+        doc = await collection.get(
+            processid,
+            GetOptions(timeout=datetime.timedelta(seconds=_CB_INDEX_TIMEOUT)),
+        )
+    except (
+        AmbiguousTimeoutException,
+        CollectionNotFoundException,
+        DocumentNotFoundException,
+        UnAmbiguousTimeoutException,
+    ):
+        return None
+
+    return doc.content_as[dict]["record_ids"]
+
+
+###
+# Terms DAO
+###
+
+
+async def query_term_hits(partial_term, term_scope, limit):
+    query, params = dao._term_hits_query(partial_term, term_scope, limit)
+    rows = await _query_rows(
+        "query_term_hits", query, params, [partial_term, term_scope]
+    )
+
+    term_hits = []
+    for row in rows:
+        term_hits.append(row["accepted_terms"])
+
+    return term_hits
+
+
+async def get_cb_counts(triplets):
+    query, params = dao._counts_query(triplets)
+    rows = await _query_rows("get_cb_counts", query, params, ujson.dumps(params))
+
+    return dao._reduce_counts(rows)
+
+
+async def resolve_terms(terms):
+    resolved_triplets, missing_terms = await asyncio.to_thread(
+        dao._get_cached_resolved_terms, terms
+    )
+
+    if missing_terms:
+        query, params = dao._resolve_terms_query(missing_terms)
+        rows = await _query_rows("resolve_terms", query, params, missing_terms)
+
+        missing_triplets = dao._rows_to_resolved_triplets(rows, missing_terms)
+        await asyncio.to_thread(dao._write_cached_resolved_terms, missing_triplets)
+        resolved_triplets.update(missing_triplets)
+
+    return resolved_triplets
+
+
+async def resolve_term(term):
+    return (await resolve_terms([term]))[term]
+
+
+###
+# Ancillary DAO
+###
+
+
+async def get_cb_ancillary_documents(
+    ancillary_collection,
+    derived_collection,
+    ancillary_join_key,
+    derived_join_key,
+    join_type="LEFT JOIN",
+    ancillary_key=None,
+    values=None,
+):
+    query, params = dao._ancillary_query(
+        ancillary_collection,
+        derived_collection,
+        ancillary_join_key,
+        derived_join_key,
+        join_type,
+        ancillary_key,
+        values,
+    )
+    return await _query_rows("get_cb_ancillary_documents", query, params, values)
+
+
+async def get_cb_ancillary_taxonomy_documents(limit=100):
+    query, params = dao._ancillary_taxonomy_query(limit)
+    return await _query_rows(
+        "get_cb_ancillary_taxonomy_documents", query, params, limit
+    )
+
+
+###
+# Special Queries DAO
+###
+
+
+async def get_cb_taxonomy_summaries_by_name_and_rank(name, rank):
+    query = dao._taxonomy_summaries_query("taxon = $name AND rank_name = $rank")
+    return await _query_rows(
+        "get_cb_taxonomy_summaries_by_name_and_rank",
+        query,
+        {"name": name, "rank": rank},
+        [name, rank],
+    )
+
+
+async def get_cb_taxonomy_summaries_by_taxids(taxids):
+    query = dao._taxonomy_summaries_query("taxid IN $taxids")
+    return await _query_rows(
+        "get_cb_taxonomy_summaries_by_taxids", query, {"taxids": taxids}, taxids
+    )
+
+
+async def get_cb_taxonomy_summaries_by_parent_taxids(parent_taxids):
+    query = dao._taxonomy_summaries_query("parent_taxid IN $parent_taxids")
+    return await _query_rows(
+        "get_cb_taxonomy_summaries_by_parent_taxids",
+        query,
+        {"parent_taxids": parent_taxids},
+        parent_taxids,
+    )
+
+
+async def get_cb_taxonomy_paths(triplets):
+    query, params = dao._taxonomy_paths_query(triplets)
+    return await _query_rows(
+        "get_cb_taxonomy_paths", query, params, ujson.dumps(params)
+    )
+
+
+async def _get_stat(name):
+    rows = await _query_rows(name, dao._STAT_QUERIES[name])
+
+    stat = 0
+    for row in rows:
+        stat = row["count"]
+
+    return stat
+
+
+async def get_total_seqs_stat():
+    return await _get_stat("get_total_seqs_stat")
+
+
+async def get_total_bins_stat():
+    return await _get_stat("get_total_bins_stat")
+
+
+async def get_animal_species_stat():
+    return await _get_stat("get_animal_species_stat")
+
+
+async def get_plant_species_stat():
+    return await _get_stat("get_plant_species_stat")
+
+
+async def get_fungi_species_stat():
+    return await _get_stat("get_fungi_species_stat")
+
+
+async def get_other_species_stat():
+    return await _get_stat("get_other_species_stat")
@@ -13,6 +13,48 @@ const endpoints = [
         isDownload: false,
         expectedkeys: ["data"]
     },
+    {
+        url: '/api/documents/eAFLT823KijKL8vMS07VLy5JLEm18s8rSSzKzLfOyczNLElNAQDp5A1l',
+        method: 'GET',
+        body: {},
+        qs: {
+            length: 10,
+            start: 0,
+            fields: 'processid,species'
+        },
+        headers: {},
+        expectedStatus: 200,
+        failOnStatusCode: true,
+        isDownload: false,
+        expectedkeys: ["data"]
+    },
+    {
+        url: '/api/documents/eAFLT823KijKL8vMS07VLy5JLEm18s8rSSzKzLfOyczNLElNAQDp5A1l',
+        method: 'GET',
+        body: {},
+        qs: {
+            length: 10,
+            start: 0,
+            fields: 'processid,unknown'
+        },
+        headers: {},
+        expectedStatus: 400,
+        failOnStatusCode: false,
+        isDownload: false
+    },
+    {
+        url: '/api/documents/eAFLT823KijKL8vMS07VLy5JLEm18s8rSSzKzLfOyczNLElNAQDp5A1l/page',
+        method: 'GET',
+        body: {},
+        qs: {
+            length: 10
+        },
+        headers: {},
+        expectedStatus: 200,
+        failOnStatusCode: true,
+        isDownload: false,
+        expectedkeys: ["data", "next_cursor"]
+    },
     {
         url: '/api/documents/eAFLT823KijKL8vMS07VLy5JLEm18s8rSSzKzLfOyczNLElNAQDp5A1l/query',
         method: 'GET',
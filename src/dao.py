@@ -1,11 +1,12 @@
 import datetime
 import logging
 import re
+import threading
 import time
 import ujson
 import uuid
-from collections import defaultdict
-from functools import lru_cache
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from couchbase.auth import PasswordAuthenticator
 from couchbase.cluster import Cluster
@@ -17,10 +18,13 @@ from couchbase.options import (
 )
 
 from settings import settings
+import util
 
 query_logger = logging.getLogger("query_logger")
 
 _ID_PATTERN = re.compile(r"\W")
+_TERM_TTL = 86400  # Seconds a term resolution is cached
+_TERM_NEGATIVE_TTL = 3600  # Seconds a term that did not resolve is cached
 EXTENT_LIMIT = {"limited": 1000, "large": 20000}
 
 # Couchbase defaults
@@ -30,9 +34,8 @@ _CB_PASS = settings.couchbase_password
 _CB_TIMEOUT = settings.couchbase_timeout
 
 # TODO: Refine timeout options
-_CB_CLUSTER = Cluster(
-    _CB_ENDPOINT,
-    ClusterOptions(PasswordAuthenticator(_CB_USER, _CB_PASS)),
+_CB_OPTIONS = ClusterOptions(
+    PasswordAuthenticator(_CB_USER, _CB_PASS),
     timeout_options=ClusterTimeoutOptions(
         bootstrap_timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
         connect_timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
@@ -48,6 +51,7 @@ _CB_CLUSTER = Cluster(
         config_idle_redial_timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
     ),
 )
+_CB_CLUSTER = Cluster(_CB_ENDPOINT, _CB_OPTIONS)
 _CB_CLUSTER.wait_until_ready(datetime.timedelta(seconds=5))
 
 NAME_MAP = {
@@ -63,6 +67,7 @@ NAME_MAP = {
     "dataset_summary": {"bucket": "DERIVED", "collection": "dataset_summaries"},
     "primer_summary": {"bucket": "DERIVED", "collection": "primer_summaries"},
     "taxonomy_summary": {"bucket": "DERIVED", "collection": "taxonomy_summaries"},
+    "processid_index": {"bucket": "DERIVED", "collection": "processid_records"},
     "terms": {"bucket": "DERIVED", "collection": "accepted_terms"},
     "ancillary": {"bucket": "ANCILLARY"},
 }
@@ -124,6 +129,45 @@ def _get_scopes():
     return list(COLUMN_MAPPING.keys())
 
 
+###
+# Prepared Statements
+###
+
+# Executions per canonical statement. Statements run with adhoc=False, so the query
+# service plans a statement once and every later execution reuses the prepared plan
+_PREPARED_STATEMENTS = Counter()
+_PREPARED_STATEMENTS_LOCK = threading.Lock()
+
+
+def _prepare_statement(query, adhoc=False):
+    statement = " ".join(query.split())
+
+    if settings.couchbase_prepared_statements and not adhoc:
+        with _PREPARED_STATEMENTS_LOCK:
+            _PREPARED_STATEMENTS[statement] += 1
+
+    return statement
+
+
+def _query_options(params=None, adhoc=False):
+    return QueryOptions(
+        timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
+        named_parameters=params,
+        adhoc=adhoc or not settings.couchbase_prepared_statements,
+        metrics=True,
+    )
+
+
+def get_prepared_statement_stats():
+    with _PREPARED_STATEMENTS_LOCK:
+        statements = _PREPARED_STATEMENTS.most_common()
+
+    return [
+        {"statement": statement, "executions": executions, "hits": executions - 1}
+        for statement, executions in statements
+    ]
+
+
 def _triplets_to_condition(triplets: list):
     # Query object has 3 layers: dict (scope), dict(subscope), list(values). This
     # is used to build the params and conditions for querying. This structure makes
@@ -153,8 +197,10 @@ def _triplets_to_condition(triplets: list):
     conditions_list = []
     params = {}
 
-    # Loop through query_obj and join together those in the same scope with an OR
-    for scope, columns in query_obj.items():
+    # Loop through query_obj and join together those in the same scope with an OR.
+    # Scopes and columns are sorted so the same combination always yields the same
+    # statement, which keeps the prepared statement cache effective
+    for scope, columns in sorted(query_obj.items()):
         if scope == "all":
             conditions_list.append("1 = 1")
             continue
@@ -171,7 +217,7 @@ def _triplets_to_condition(triplets: list):
             condition_set = " OR ".join(
                 [
                     f"ANY code IN bold_recordset_code_arr SATISFIES code IN ${scope}_{re.sub(_ID_PATTERN, '_', column)} END"
-                    for column in columns.keys()
+                    for column in sorted(columns.keys())
                 ]
             )
         else:
@@ -179,7 +225,7 @@ def _triplets_to_condition(triplets: list):
             condition_set = " OR ".join(
                 [
                     f"`{column}` IN ${scope}_{re.sub(_ID_PATTERN, '_', column)}"
-                    for column in columns.keys()
+                    for column in sorted(columns.keys())
                 ]
             )
             condition_set = f"({condition_set})"
@@ -263,8 +309,10 @@ def _triplets_to_condition_terms(triplets: list):
     conditions_list = []
     params = {}
 
-    # Loop through query_obj and join together those in the same scope with an OR
-    for scope, columns in query_obj.items():
+    # Loop through query_obj and join together those in the same scope with an OR.
+    # Scopes and columns are sorted so the same combination always yields the same
+    # statement, which keeps the prepared statement cache effective
+    for scope, columns in sorted(query_obj.items()):
         if scope == "all":
             conditions_list.append("1 = 1")
             continue
@@ -281,7 +329,7 @@ def _triplets_to_condition_terms(triplets: list):
         condition_set = " OR ".join(
             [
                 f"(`scope` = '{scope}' AND field = '{column}' AND term IN ${scope}_{re.sub(_ID_PATTERN, '_', column)})"
-                for column in columns.keys()
+                for column in sorted(columns.keys())
             ]
         )
 
@@ -293,7 +341,30 @@ def _triplets_to_condition_terms(triplets: list):
     return conditions, params
 
 
-def get_cb_meta_ids(triplets, bucket, collection):
+def _query_rows(name, query, params=None, log_params="", adhoc=False):
+    query = _prepare_statement(query, adhoc)
+
+    query_uuid = uuid.uuid4()
+    query_logger.info(f"Start {name} - UUID: {query_uuid} {query} {log_params}")
+
+    start_time = time.perf_counter()
+
+    results = _get_cb_cluster().query(query, _query_options(params, adhoc))
+
+    rows = []
+    for row in results.rows():
+        rows.append(row)
+
+    end_time = time.perf_counter()
+
+    query_logger.info(
+        f"End {name} - UUID: {query_uuid} {query} {log_params} {results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
+    )
+
+    return rows
+
+
+def _meta_ids_query(triplets, bucket, collection):
     conditions, params = _triplets_to_condition(triplets)
     extent = triplets[-1]
 
@@ -305,85 +376,48 @@ def get_cb_meta_ids(triplets, bucket, collection):
     if extent == "zero":
         query = f"{query} AND 1 = 0"
     elif extent != "full":
-        query = f"{query} LIMIT {EXTENT_LIMIT.get(extent, 1)}"
+        query = f"{query} LIMIT $limit"
+        params["limit"] = EXTENT_LIMIT.get(extent, 1)
 
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start get_cb_meta_ids - UUID: {query_uuid} {' '.join(query.split())} {ujson.dumps(params)}"
-    )
+    return query, params
 
-    start_time = time.perf_counter()
 
-    id_results = _get_cb_cluster().query(
-        query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            named_parameters=params,
-            metrics=True,
-        ),
-    )
+def get_cb_meta_ids(triplets, bucket, collection):
+    query, params = _meta_ids_query(triplets, bucket, collection)
+    rows = _query_rows("get_cb_meta_ids", query, params, ujson.dumps(params))
 
     meta_ids = []
-    for meta_id in id_results:
+    for meta_id in rows:
         meta_ids.append(meta_id["id"])
 
-    end_time = time.perf_counter()
-
-    query_logger.info(
-        f"End get_cb_meta_ids - UUID: {query_uuid} {' '.join(query.split())} {ujson.dumps(params)} {id_results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
-    )
-
     return meta_ids
 
 
-def get_cb_field_values(triplets, fields, bucket, collection, limit=None):
-    if not fields:
-        return []
-
+def _field_values_query(triplets, fields, bucket, collection, limit=None):
     conditions, params = _triplets_to_condition(triplets)
 
     query = f"""
         SELECT
-            {', '.join(fields)}
+            {', '.join(sorted(fields))}
         FROM `{bucket}`.`_default`.`{collection}`
         WHERE {conditions}
     """
     if limit:
-        query = f"{query} LIMIT {limit}"
-
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start get_cb_field_values - UUID: {query_uuid} {' '.join(query.split())} {ujson.dumps(params)}"
-    )
+        query = f"{query} LIMIT $limit"
+        params["limit"] = limit
 
-    start_time = time.perf_counter()
+    return query, params
 
-    results = _get_cb_cluster().query(
-        query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            named_parameters=params,
-            metrics=True,
-        ),
-    )
-
-    documents = []
-    for row in results.rows():
-        documents.append(row)
 
-    end_time = time.perf_counter()
-
-    query_logger.info(
-        f"End get_cb_field_values - UUID: {query_uuid} {' '.join(query.split())} {ujson.dumps(params)} {results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
-    )
-
-    return documents
-
-
-def get_cb_group_by_field_documents(triplets, fields, bucket, collection):
+def get_cb_field_values(triplets, fields, bucket, collection, limit=None):
     if not fields:
         return []
 
+    query, params = _field_values_query(triplets, fields, bucket, collection, limit)
+    return _query_rows("get_cb_field_values", query, params, ujson.dumps(params))
+
+
+def _group_by_field_counts_queries(triplets, fields, bucket, collection):
     conditions, params = _triplets_to_condition(triplets)
 
     queries = [
@@ -391,42 +425,60 @@ def get_cb_group_by_field_documents(triplets, fields, bucket, collection):
         SELECT
             "{field}" AS field,
             {field} AS val,
-            ARRAY_AGG(processid) AS processids
+            COUNT(DISTINCT processid) AS specimens,
+            COUNT(*) AS records
         FROM `{bucket}`.`_default`.`{collection}`
         WHERE {conditions}
         GROUP BY {field}
     """
-        for field in fields
+        for field in sorted(fields)
     ]
-    query = " UNION ".join(queries)
 
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start get_cb_group_by_field_documents - UUID: {query_uuid} {' '.join(query.split())} {ujson.dumps(params)}"
-    )
+    return queries, params
 
-    start_time = time.perf_counter()
 
-    results = _get_cb_cluster().query(
-        query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            named_parameters=params,
-            metrics=True,
-        ),
-    )
+def _query_rows_concurrently(name, queries, params):
+    with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+        results = executor.map(
+            lambda query: _query_rows(name, query, params, ujson.dumps(params)),
+            queries,
+        )
+        return [row for rows in results for row in rows]
 
-    documents = []
-    for row in results.rows():
-        documents.append(row)
 
-    end_time = time.perf_counter()
+def get_cb_group_by_field_documents(triplets, fields, bucket, collection):
+    if not fields:
+        return []
 
-    query_logger.info(
-        f"End get_cb_group_by_field_documents - UUID: {query_uuid} {' '.join(query.split())} {ujson.dumps(params)} {results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
+    # Count values server-side with one query per field, run concurrently, instead
+    # of shipping every processid back in a single UNION
+    queries, params = _group_by_field_counts_queries(
+        triplets, fields, bucket, collection
     )
+    return _query_rows_concurrently("get_cb_group_by_field_documents", queries, params)
+
+
+def _distinct_counts_query(triplets, fields, bucket, collection):
+    conditions, params = _triplets_to_condition(triplets)
+
+    query = f"""
+        SELECT
+            {', '.join([f"COUNT(DISTINCT {field}) AS {field}" for field in sorted(fields)])}
+        FROM `{bucket}`.`_default`.`{collection}`
+        WHERE {conditions}
+    """
+
+    return query, params
 
-    return documents
+
+def get_cb_distinct_counts(triplets, fields, bucket, collection):
+    if not fields:
+        return {}
+
+    query, params = _distinct_counts_query(triplets, fields, bucket, collection)
+    rows = _query_rows("get_cb_distinct_counts", query, params, ujson.dumps(params))
+
+    return rows[0] if rows else {}
 
 
 def get_cb_documents(meta_ids, bucket, collection):
@@ -463,12 +515,44 @@ def get_cb_documents(meta_ids, bucket, collection):
     return results
 
 
+def _document_fields_query(meta_ids, fields, bucket, collection):
+    # Fields are projected in a stable order, so a field set has a single statement
+    projection = ", ".join(f"d.`{field}`" for field in sorted(fields))
+
+    query = f"""
+        SELECT meta(d).id AS `__id`, {projection}
+        FROM `{bucket}`.`_default`.`{collection}` d
+        USE KEYS $meta_ids
+    """
+
+    return query, {"meta_ids": meta_ids}
+
+
+def get_cb_document_fields(meta_ids, fields, bucket, collection):
+    query, params = _document_fields_query(meta_ids, fields, bucket, collection)
+    # Run ad hoc, as any subset of BCDM fields may be requested and preparing each
+    # one would fill the prepared statement cache
+    rows = _query_rows(
+        "get_cb_document_fields",
+        query,
+        params,
+        f"{len(meta_ids)} meta_id(s)",
+        adhoc=True,
+    )
+
+    result_map = {}
+    for row in rows:
+        result_map[row.pop("__id")] = row
+
+    return [result_map.get(meta_id, {}) for meta_id in meta_ids]
+
+
 ###
 # Terms DAO
 ###
 
 
-def query_term_hits(partial_term, term_scope, limit):
+def _term_hits_query(partial_term, term_scope, limit):
     clause = f"standardized_term LIKE $partial_term || '%'"
     if term_scope:
         clause += f" AND `scope` = $scope"
@@ -478,39 +562,35 @@ def query_term_hits(partial_term, term_scope, limit):
         FROM `{NAME_MAP["terms"]["bucket"]}`.`_default`.`{NAME_MAP["terms"]["collection"]}`
         WHERE {clause}
         ORDER BY records DESC, standardized_term ASC
-        LIMIT {limit}
+        LIMIT $limit
     """
 
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start query_term_hits - UUID: {query_uuid} {' '.join(query.split())} {[partial_term, term_scope]}"
-    )
+    return query, {"partial_term": partial_term, "scope": term_scope, "limit": limit}
 
-    start_time = time.perf_counter()
 
-    term_results = _get_cb_cluster().query(
-        query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            named_parameters={"partial_term": partial_term, "scope": term_scope},
-            metrics=True,
-        ),
-    )
+def query_term_hits(partial_term, term_scope, limit):
+    query, params = _term_hits_query(partial_term, term_scope, limit)
+    rows = _query_rows("query_term_hits", query, params, [partial_term, term_scope])
 
     term_hits = []
-    for row in term_results.rows():
+    for row in rows:
         term_hits.append(row["accepted_terms"])
 
-    end_time = time.perf_counter()
+    return term_hits
 
-    query_logger.info(
-        f"End query_term_hits - UUID: {query_uuid} {' '.join(query.split())} {[partial_term, term_scope]} {term_results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
-    )
 
-    return term_hits
+def _accepted_terms_query():
+    return f"""
+        SELECT RAW t
+        FROM `{NAME_MAP["terms"]["bucket"]}`.`_default`.`{NAME_MAP["terms"]["collection"]}` t
+    """
 
 
-def get_cb_counts(triplets):
+def get_cb_accepted_terms():
+    return _query_rows("get_cb_accepted_terms", _accepted_terms_query())
+
+
+def _counts_query(triplets):
     # TODO: Merge with standard fields fetch? Need to resolve difference in triplets_to_condition
     conditions, params = _triplets_to_condition_terms(triplets)
 
@@ -520,74 +600,95 @@ def get_cb_counts(triplets):
         WHERE {conditions}
     """
 
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start get_cb_counts - UUID: {query_uuid} {' '.join(query.split())} {ujson.dumps(params)}"
-    )
-
-    start_time = time.perf_counter()
+    return query, params
 
-    term_results = _get_cb_cluster().query(
-        query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            named_parameters=params,
-            metrics=True,
-        ),
-    )
 
+def _reduce_counts(rows):
     stats = {"records": 0, "summaries": 0}
-    for row in term_results.rows():
+    for row in rows:
         stats["records"] += row["records"]
         stats["summaries"] += row["summaries"]
 
-    end_time = time.perf_counter()
+    return stats
 
-    query_logger.info(
-        f"End get_cb_counts - UUID: {query_uuid} {' '.join(query.split())} {ujson.dumps(params)} {term_results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
-    )
 
-    return stats
+def get_cb_counts(triplets):
+    query, params = _counts_query(triplets)
+    rows = _query_rows("get_cb_counts", query, params, ujson.dumps(params))
 
+    return _reduce_counts(rows)
 
-@lru_cache()
-def resolve_term(term):
+
+def _resolve_terms_query(terms):
     # TODO: Merge with standard fields fetch? But WHERE clause needs to be less strict?
     query = f"""
-        SELECT `scope`, field
+        SELECT term, `scope`, field
         FROM `{NAME_MAP["terms"]["bucket"]}`.`_default`.`{NAME_MAP["terms"]["collection"]}`
-        WHERE term = $term
+        WHERE term IN $terms
     """
 
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start resolve_term - UUID: {query_uuid} {' '.join(query.split())} {term}"
-    )
-
-    start_time = time.perf_counter()
+    return query, {"terms": terms}
 
-    term_results = _get_cb_cluster().query(
-        query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            named_parameters={"term": term},
-            metrics=True,
-        ),
-    )
 
-    triplets = []
-    for row in term_results.rows():
+def _rows_to_resolved_triplets(rows, terms):
+    resolved_triplets = {term: [] for term in terms}
+    for row in rows:
+        term = row["term"]
         scope = row["scope"]
         subscope = row["field"]
-        triplets.append(f"{scope}:{subscope}:{term}")
+        resolved_triplets[term].append(f"{scope}:{subscope}:{term}")
 
-    end_time = time.perf_counter()
+    return resolved_triplets
 
-    query_logger.info(
-        f"End resolve_term - UUID: {query_uuid} {' '.join(query.split())} {term} {term_results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
+
+def _get_cached_resolved_terms(terms):
+    # Resolutions are shared between workers in Redis for the data release, including
+    # terms that did not resolve, so only unseen terms are queried
+    terms = list(dict.fromkeys(terms))
+    cached = util.get_cache_from_meta_ids(
+        [util.generate_term_meta_id(term) for term in terms]
     )
 
-    return triplets
+    resolved_triplets = {}
+    missing_terms = []
+    for term, triplets in zip(terms, cached):
+        if triplets is None:
+            missing_terms.append(term)
+        else:
+            resolved_triplets[term] = ujson.loads(triplets)
+
+    return resolved_triplets, missing_terms
+
+
+def _write_cached_resolved_terms(resolved_triplets):
+    resolved = {}
+    unresolved = {}
+    for term, triplets in resolved_triplets.items():
+        meta_id = util.generate_term_meta_id(term)
+        (resolved if triplets else unresolved)[meta_id] = ujson.dumps(triplets)
+
+    if resolved:
+        util.write_cache_with_meta_ids(resolved, _TERM_TTL)
+    if unresolved:
+        util.write_cache_with_meta_ids(unresolved, _TERM_NEGATIVE_TTL)
+
+
+def resolve_terms(terms):
+    resolved_triplets, missing_terms = _get_cached_resolved_terms(terms)
+
+    if missing_terms:
+        query, params = _resolve_terms_query(missing_terms)
+        rows = _query_rows("resolve_terms", query, params, missing_terms)
+
+        missing_triplets = _rows_to_resolved_triplets(rows, missing_terms)
+        _write_cached_resolved_terms(missing_triplets)
+        resolved_triplets.update(missing_triplets)
+
+    return resolved_triplets
+
+
+def resolve_term(term):
+    return resolve_terms([term])[term]
 
 
 ###
@@ -595,7 +696,7 @@ def resolve_term(term):
 ###
 
 
-def get_cb_ancillary_documents(
+def _ancillary_query(
     ancillary_collection,
     derived_collection,
     ancillary_join_key,
@@ -617,68 +718,43 @@ def get_cb_ancillary_documents(
             WHERE registry.`{ancillary_key}` IN $values
         """
 
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start get_cb_ancillary_documents - UUID: {query_uuid} {' '.join(query.split())} {values}"
-    )
+    return query, {"values": values}
 
-    start_time = time.perf_counter()
 
-    anc_results = _get_cb_cluster().query(
-        query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            named_parameters={"values": values},
-            metrics=True,
-        ),
-    )
-
-    documents = []
-    for row in anc_results.rows():
-        documents.append(row)
-
-    end_time = time.perf_counter()
-
-    query_logger.info(
-        f"End get_cb_ancillary_documents - UUID: {query_uuid} {' '.join(query.split())} {values} {anc_results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
+def get_cb_ancillary_documents(
+    ancillary_collection,
+    derived_collection,
+    ancillary_join_key,
+    derived_join_key,
+    join_type="LEFT JOIN",
+    ancillary_key=None,
+    values=None,
+):
+    query, params = _ancillary_query(
+        ancillary_collection,
+        derived_collection,
+        ancillary_join_key,
+        derived_join_key,
+        join_type,
+        ancillary_key,
+        values,
     )
+    return _query_rows("get_cb_ancillary_documents", query, params, values)
 
-    return documents
 
-
-def get_cb_ancillary_taxonomy_documents(limit=100):
+def _ancillary_taxonomy_query(limit=100):
     query = f"""
         SELECT registry.*
         FROM `{NAME_MAP["ancillary"]["bucket"]}`.`_default`.`taxonomies` as registry
-        LIMIT {limit}
+        LIMIT $limit
     """
 
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start get_cb_ancillary_taxonomy_documents - UUID: {query_uuid} {' '.join(query.split())} {limit}"
-    )
-
-    start_time = time.perf_counter()
-
-    anc_results = _get_cb_cluster().query(
-        query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            metrics=True,
-        ),
-    )
-
-    documents = []
-    for row in anc_results.rows():
-        documents.append(row)
-
-    end_time = time.perf_counter()
+    return query, {"limit": limit}
 
-    query_logger.info(
-        f"End get_cb_ancillary_taxonomy_documents - UUID: {query_uuid} {' '.join(query.split())} {limit} {anc_results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
-    )
 
-    return documents
+def get_cb_ancillary_taxonomy_documents(limit=100):
+    query, params = _ancillary_taxonomy_query(limit)
+    return _query_rows("get_cb_ancillary_taxonomy_documents", query, params, limit)
 
 
 ###
@@ -686,393 +762,145 @@ def get_cb_ancillary_taxonomy_documents(limit=100):
 ###
 
 
-def get_cb_taxonomy_summaries_by_name_and_rank(name, rank):
-    query = f"""
+def _taxonomy_summaries_query(condition):
+    return f"""
         SELECT `{NAME_MAP["taxonomy_summary"]["collection"]}`.*
         FROM `{NAME_MAP["taxonomy_summary"]["bucket"]}`.`_default`.`{NAME_MAP["taxonomy_summary"]["collection"]}`
-        WHERE taxon = $name AND rank_name = $rank
+        WHERE {condition}
     """
 
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start get_cb_taxonomy_summaries_by_name_and_rank - UUID: {query_uuid} {' '.join(query.split())} {[name, rank]}"
-    )
 
-    start_time = time.perf_counter()
-
-    results = _get_cb_cluster().query(
+def get_cb_taxonomy_summaries_by_name_and_rank(name, rank):
+    query = _taxonomy_summaries_query("taxon = $name AND rank_name = $rank")
+    return _query_rows(
+        "get_cb_taxonomy_summaries_by_name_and_rank",
         query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            named_parameters={"name": name, "rank": rank},
-            metrics=True,
-        ),
+        {"name": name, "rank": rank},
+        [name, rank],
     )
 
-    documents = []
-    for row in results.rows():
-        documents.append(row)
-
-    end_time = time.perf_counter()
-
-    query_logger.info(
-        f"End get_cb_taxonomy_summaries_by_name_and_rank - UUID: {query_uuid} {' '.join(query.split())} {[name, rank]} {results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
-    )
-
-    return documents
-
 
 def get_cb_taxonomy_summaries_by_taxids(taxids):
-    query = f"""
-        SELECT `{NAME_MAP["taxonomy_summary"]["collection"]}`.*
-        FROM `{NAME_MAP["taxonomy_summary"]["bucket"]}`.`_default`.`{NAME_MAP["taxonomy_summary"]["collection"]}`
-        WHERE taxid IN $taxids
-    """
-
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start get_cb_taxonomy_summaries_by_taxids - UUID: {query_uuid} {' '.join(query.split())} {taxids}"
-    )
-
-    start_time = time.perf_counter()
-
-    results = _get_cb_cluster().query(
-        query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            named_parameters={"taxids": taxids},
-            metrics=True,
-        ),
+    query = _taxonomy_summaries_query("taxid IN $taxids")
+    return _query_rows(
+        "get_cb_taxonomy_summaries_by_taxids", query, {"taxids": taxids}, taxids
     )
 
-    documents = []
-    for row in results.rows():
-        documents.append(row)
-
-    end_time = time.perf_counter()
-
-    query_logger.info(
-        f"End get_cb_taxonomy_summaries_by_taxids - UUID: {query_uuid} {' '.join(query.split())} {taxids} {results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
-    )
-
-    return documents
-
 
 def get_cb_taxonomy_summaries_by_parent_taxids(parent_taxids):
-    query = f"""
-        SELECT `{NAME_MAP["taxonomy_summary"]["collection"]}`.*
-        FROM `{NAME_MAP["taxonomy_summary"]["bucket"]}`.`_default`.`{NAME_MAP["taxonomy_summary"]["collection"]}`
-        WHERE parent_taxid IN $parent_taxids
-    """
-
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start get_cb_taxonomy_summaries_by_parent_taxids - UUID: {query_uuid} {' '.join(query.split())} {parent_taxids}"
-    )
-
-    start_time = time.perf_counter()
-
-    results = _get_cb_cluster().query(
+    query = _taxonomy_summaries_query("parent_taxid IN $parent_taxids")
+    return _query_rows(
+        "get_cb_taxonomy_summaries_by_parent_taxids",
         query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            named_parameters={"parent_taxids": parent_taxids},
-            metrics=True,
-        ),
+        {"parent_taxids": parent_taxids},
+        parent_taxids,
     )
 
-    documents = []
-    for row in results.rows():
-        documents.append(row)
-
-    end_time = time.perf_counter()
-
-    query_logger.info(
-        f"End get_cb_taxonomy_summaries_by_parent_taxids - UUID: {query_uuid} {' '.join(query.split())} {parent_taxids} {results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
-    )
 
-    return documents
-
-
-def get_cb_taxonomy_paths(triplets):
+def _taxonomy_paths_query(triplets):
     conditions, params = _triplets_to_condition(triplets)
 
     query = f"""
         SELECT kingdom, phylum, class, `order`, family, subfamily,
-            tribe, genus, species, subspecies, ARRAY_AGG(processid) AS processids
+            tribe, genus, species, subspecies, COUNT(DISTINCT processid) AS specimens
         FROM `{NAME_MAP["primary_data"]["bucket"]}`.`_default`.`{NAME_MAP["primary_data"]["collection"]}`
         WHERE {conditions}
         GROUP BY kingdom, phylum, class, `order`, family, subfamily,
             tribe, genus, species, subspecies
     """
 
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start get_cb_taxonomy_paths - UUID: {query_uuid} {' '.join(query.split())} {ujson.dumps(params)}"
-    )
-
-    start_time = time.perf_counter()
+    return query, params
 
-    results = _get_cb_cluster().query(
-        query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            named_parameters=params,
-            metrics=True,
-        ),
-    )
-
-    documents = []
-    for row in results.rows():
-        row["specimens"] = len(set(row["processids"]))
-        documents.append(row)
-
-    end_time = time.perf_counter()
 
-    query_logger.info(
-        f"End get_cb_taxonomy_paths - UUID: {query_uuid} {' '.join(query.split())} {ujson.dumps(params)} {results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
-    )
+def get_cb_taxonomy_paths(triplets):
+    query, params = _taxonomy_paths_query(triplets)
+    return _query_rows("get_cb_taxonomy_paths", query, params, ujson.dumps(params))
 
-    return documents
 
+_SPECIES_STAT_FILTERS = """
+            AND species NOT LIKE '% % %'
+            AND species NOT LIKE '% sp'
+            AND species NOT LIKE '%.%'
+            AND species NOT LIKE '%.%'
+            AND NOT REGEXP_CONTAINS(species, '[0-9]')
+            AND species NOT LIKE '%Janzen%'
+"""
 
-def get_total_seqs_stat():
-    query = f"""
+_STAT_QUERIES = {
+    "get_total_seqs_stat": f"""
         SELECT COUNT(DISTINCT processid) AS count
         FROM `{NAME_MAP["primary_data"]["bucket"]}`.`_default`.`{NAME_MAP["primary_data"]["collection"]}`
         WHERE marker_code IN ['COI-5P', 'rbcL', 'matK', 'ITS', 'rbcLa'] AND nuc_basecount > 486
-    """
-
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start get_total_seqs_stat - UUID: {query_uuid} {' '.join(query.split())}"
-    )
-
-    start_time = time.perf_counter()
-
-    results = _get_cb_cluster().query(
-        query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            metrics=True,
-        ),
-    )
-
-    stat = 0
-    for row in results.rows():
-        stat = row["count"]
-
-    end_time = time.perf_counter()
-
-    query_logger.info(
-        f"End get_total_seqs_stat - UUID: {query_uuid} {' '.join(query.split())} {results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
-    )
-
-    return stat
-
-
-def get_total_bins_stat():
-    query = f"""
+    """,
+    "get_total_bins_stat": f"""
         SELECT COUNT(DISTINCT bin_uri) AS count
         FROM `{NAME_MAP["primary_data"]["bucket"]}`.`_default`.`{NAME_MAP["primary_data"]["collection"]}`
         WHERE bin_uri IS NOT NULL
-    """
-
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start get_total_bins_stat - UUID: {query_uuid} {' '.join(query.split())}"
-    )
-
-    start_time = time.perf_counter()
-
-    results = _get_cb_cluster().query(
-        query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            metrics=True,
-        ),
-    )
-
-    stat = 0
-    for row in results.rows():
-        stat = row["count"]
-
-    end_time = time.perf_counter()
-
-    query_logger.info(
-        f"End get_total_bins_stat - UUID: {query_uuid} {' '.join(query.split())} {results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
-    )
-
-    return stat
-
-
-def get_animal_species_stat():
-    query = f"""
+    """,
+    "get_animal_species_stat": f"""
         SELECT COUNT(DISTINCT species) AS count
         FROM `{NAME_MAP["primary_data"]["bucket"]}`.`_default`.`{NAME_MAP["primary_data"]["collection"]}`
         WHERE species IS NOT MISSING
             AND nuc_basecount > 486 AND marker_code IN ['COI-5P']
             AND kingdom = 'Animalia'
-            AND species NOT LIKE '% % %'
-            AND species NOT LIKE '% sp'
-            AND species NOT LIKE '%.%'
-            AND species NOT LIKE '%.%'
-            AND NOT REGEXP_CONTAINS(species, '[0-9]')
-            AND species NOT LIKE '%Janzen%'
-    """
-
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start get_animal_species_stat - UUID: {query_uuid} {' '.join(query.split())}"
-    )
-
-    start_time = time.perf_counter()
-
-    results = _get_cb_cluster().query(
-        query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            metrics=True,
-        ),
-    )
-
-    stat = 0
-    for row in results.rows():
-        stat = row["count"]
-
-    end_time = time.perf_counter()
-
-    query_logger.info(
-        f"End get_animal_species_stat - UUID: {query_uuid} {' '.join(query.split())} {results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
-    )
-
-    return stat
-
-
-def get_plant_species_stat():
-    query = f"""
+            {_SPECIES_STAT_FILTERS}
+    """,
+    "get_plant_species_stat": f"""
         SELECT COUNT(DISTINCT species) AS count
         FROM `{NAME_MAP["primary_data"]["bucket"]}`.`_default`.`{NAME_MAP["primary_data"]["collection"]}`
         WHERE species IS NOT MISSING
             AND nuc_basecount > 486 AND marker_code IN ['COI-5P', 'matK', 'rbcL', 'rbcLa', 'trnH-psbA']
             AND kingdom = 'Plantae'
-            AND species NOT LIKE '% % %'
-            AND species NOT LIKE '% sp'
-            AND species NOT LIKE '%.%'
-            AND species NOT LIKE '%.%'
-            AND NOT REGEXP_CONTAINS(species, '[0-9]')
-            AND species NOT LIKE '%Janzen%'
-    """
-
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start get_plant_species_stat - UUID: {query_uuid} {' '.join(query.split())}"
-    )
-
-    start_time = time.perf_counter()
-
-    results = _get_cb_cluster().query(
-        query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            metrics=True,
-        ),
-    )
-
-    stat = 0
-    for row in results.rows():
-        stat = row["count"]
-
-    end_time = time.perf_counter()
-
-    query_logger.info(
-        f"End get_plant_species_stat - UUID: {query_uuid} {' '.join(query.split())} {results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
-    )
-
-    return stat
-
-
-def get_fungi_species_stat():
-    query = f"""
+            {_SPECIES_STAT_FILTERS}
+    """,
+    "get_fungi_species_stat": f"""
         SELECT COUNT(DISTINCT species) AS count
         FROM `{NAME_MAP["primary_data"]["bucket"]}`.`_default`.`{NAME_MAP["primary_data"]["collection"]}`
         WHERE species IS NOT MISSING
             AND nuc_basecount > 486 AND marker_code IN ['COI-5P', 'ITS', 'ITS2']
             AND kingdom = 'Fungi'
-            AND species NOT LIKE '% % %'
-            AND species NOT LIKE '% sp'
-            AND species NOT LIKE '%.%'
-            AND species NOT LIKE '%.%'
-            AND NOT REGEXP_CONTAINS(species, '[0-9]')
-            AND species NOT LIKE '%Janzen%'
-    """
+            {_SPECIES_STAT_FILTERS}
+    """,
+    "get_other_species_stat": f"""
+        SELECT COUNT(DISTINCT species) AS count
+        FROM `{NAME_MAP["primary_data"]["bucket"]}`.`_default`.`{NAME_MAP["primary_data"]["collection"]}`
+        WHERE species IS NOT MISSING
+            AND nuc_basecount > 486 AND marker_code IN ['COI-5P']
+            AND kingdom NOT IN ['Animalia', 'Plantae', 'Fungi']
+            {_SPECIES_STAT_FILTERS}
+    """,
+}
 
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start get_fungi_species_stat - UUID: {query_uuid} {' '.join(query.split())}"
-    )
 
-    start_time = time.perf_counter()
-
-    results = _get_cb_cluster().query(
-        query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            metrics=True,
-        ),
-    )
+def _get_stat(name):
+    rows = _query_rows(name, _STAT_QUERIES[name])
 
     stat = 0
-    for row in results.rows():
+    for row in rows:
         stat = row["count"]
 
-    end_time = time.perf_counter()
+    return stat
 
-    query_logger.info(
-        f"End get_fungi_species_stat - UUID: {query_uuid} {' '.join(query.split())} {results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
-    )
 
-    return stat
+def get_total_seqs_stat():
+    return _get_stat("get_total_seqs_stat")
 
 
-def get_other_species_stat():
-    query = f"""
-        SELECT COUNT(DISTINCT species) AS count
-        FROM `{NAME_MAP["primary_data"]["bucket"]}`.`_default`.`{NAME_MAP["primary_data"]["collection"]}`
-        WHERE species IS NOT MISSING
-            AND nuc_basecount > 486 AND marker_code IN ['COI-5P']
-            AND kingdom NOT IN ['Animalia', 'Plantae', 'Fungi']
-            AND species NOT LIKE '% % %'
-            AND species NOT LIKE '% sp'
-            AND species NOT LIKE '%.%'
-            AND species NOT LIKE '%.%'
-            AND NOT REGEXP_CONTAINS(species, '[0-9]')
-            AND species NOT LIKE '%Janzen%'
-    """
+def get_total_bins_stat():
+    return _get_stat("get_total_bins_stat")
 
-    query_uuid = uuid.uuid4()
-    query_logger.info(
-        f"Start get_other_species_stat - UUID: {query_uuid} {' '.join(query.split())}"
-    )
 
-    start_time = time.perf_counter()
+def get_animal_species_stat():
+    return _get_stat("get_animal_species_stat")
 
-    results = _get_cb_cluster().query(
-        query,
-        QueryOptions(
-            timeout=datetime.timedelta(seconds=_CB_TIMEOUT),
-            metrics=True,
-        ),
-    )
 
-    stat = 0
-    for row in results.rows():
-        stat = row["count"]
+def get_plant_species_stat():
+    return _get_stat("get_plant_species_stat")
 
-    end_time = time.perf_counter()
 
-    query_logger.info(
-        f"End get_other_species_stat - UUID: {query_uuid} {' '.join(query.split())} {results.metadata().metrics().execution_time().total_seconds()} {end_time - start_time}"
-    )
+def get_fungi_species_stat():
+    return _get_stat("get_fungi_species_stat")
 
-    return stat
+
+def get_other_species_stat():
+    return _get_stat("get_other_species_stat")
@@ -0,0 +1,197 @@
+import re
+import ujson
+import warnings
+
+import pandas as pd
+
+# Conversion of documents between data schemas (e.g. BCDM to DWC) as described by a
+# map file. The map is compiled once into column operations applied to whole batches
+
+
+def _get_format_affixes(value_format):
+    # Text around the %s of a format, so values are formatted by concatenating columns
+    return tuple((value_format % ("\0",)).split("\0"))
+
+
+def _normalize_nulls(values):
+    return values.astype(object).where(values.notna(), None)
+
+
+def _get_strings(values):
+    # Other values set to None, as the str accessor rejects columns without strings
+    return values.where(values.map(lambda value: isinstance(value, str)), None)
+
+
+def _get_lists(values):
+    return values.where(values.map(lambda value: isinstance(value, list)), None)
+
+
+###
+# Preprocessors
+###
+
+
+def _preprocess_string(values, pattern, prefix, suffix):
+    # Strings not already in the format are formatted, null values are kept. Other
+    # values (e.g. numeric IDs) are formatted from their text
+    values = values.map(
+        lambda value: value if value is None or isinstance(value, str) else str(value)
+    )
+    unformatted = _get_strings(values).str.match(pattern).eq(False)
+    values[unformatted] = prefix + values[unformatted] + suffix
+
+    return values
+
+
+def _parse_date(value, date_format):
+    try:
+        return pd.to_datetime(value).strftime(date_format)
+    except:
+        return None
+
+
+def _preprocess_date(values, date_format):
+    # Dates with different UTC offsets do not share a column type (pandas warns, or
+    # raises in later versions), so they are each formatted in their own offset
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", FutureWarning)
+            dates = pd.to_datetime(values, errors="coerce", format="mixed")
+    except ValueError:
+        dates = None
+
+    if dates is None or not pd.api.types.is_datetime64_any_dtype(dates):
+        return values.map(
+            lambda value: None if pd.isnull(value) else _parse_date(value, date_format)
+        )
+
+    return _normalize_nulls(dates.dt.strftime(date_format))
+
+
+###
+# Converters
+###
+
+
+def _convert_char_to_string(values, lookup):
+    return _normalize_nulls(values.map(lambda value: lookup.get(value)))
+
+
+def _convert_string_to_array(values):
+    # Strips the first opening and last closing parenthesis, then splits on commas
+    arrays = (
+        _get_strings(values)
+        .str.replace("(", "", n=1, regex=False)
+        .str.replace(r"\)(?=[^)]*$)", "", n=1, regex=True)
+        .str.split(",")
+    )
+
+    return _normalize_nulls(arrays)
+
+
+def _convert_array_to_string(values, prefix, suffix):
+    strings = _get_lists(values).str.join(",")
+    formatted = strings.notna()
+    strings[formatted] = prefix + strings[formatted] + suffix
+
+    return _normalize_nulls(strings)
+
+
+class DataMapConverter:
+    """
+    Converter of documents from one data schema to another, compiled from a map file
+    with `bcdm_field`, `bcdm_type`, `bcdm_format`, `dwc_field`, `dwc_type` and
+    `dwc_format` columns
+
+    - **map_file**: Data map TSV file
+    """
+
+    def __init__(self, map_file):
+        map_df = pd.read_csv(map_file, delimiter="\t")
+        map_df = map_df[map_df["dwc_field"].notnull()]
+
+        self.rename_map = {
+            row.bcdm_field: row.dwc_field
+            for row in map_df[["bcdm_field", "dwc_field"]].itertuples()
+        }
+        self.preprocess_map = {}
+        self.conversion_map = {}
+
+        for row in map_df.itertuples():
+            if row.bcdm_format != "default":
+                if row.bcdm_type == "string":
+                    pattern = re.compile(row.bcdm_format.replace("%s", ".*"))
+                    prefix, suffix = _get_format_affixes(row.bcdm_format)
+                    self.preprocess_map[row.bcdm_field] = (
+                        _preprocess_string,
+                        (pattern, prefix, suffix),
+                    )
+                elif row.bcdm_type == "string:date":
+                    self.preprocess_map[row.bcdm_field] = (
+                        _preprocess_date,
+                        (row.bcdm_format,),
+                    )
+                else:
+                    raise ValueError(
+                        f"Unsupported preprocess operand: {row.bcdm_type} ({row.bcdm_format})"
+                    )
+
+            if row.bcdm_type != row.dwc_type:
+                if row.bcdm_type == "char" and row.dwc_type == "string":
+                    self.conversion_map[row.bcdm_field] = (
+                        _convert_char_to_string,
+                        (ujson.loads(row.dwc_format),),
+                    )
+                elif row.bcdm_type == "string" and row.dwc_type == "array":
+                    self.conversion_map[row.bcdm_field] = (
+                        _convert_string_to_array,
+                        (),
+                    )
+                elif row.bcdm_type == "array" and row.dwc_type == "string":
+                    self.conversion_map[row.bcdm_field] = (
+                        _convert_array_to_string,
+                        _get_format_affixes(row.dwc_format),
+                    )
+                else:
+                    raise ValueError(
+                        f"Unsupported conversion operand: {row.bcdm_type} - {row.dwc_type}"
+                    )
+
+    def get_fields(self, schema=()):
+        """
+        Mapped source fields, in schema order followed by the remaining map order
+
+        - **schema**: Source schema field names
+        """
+        schema_fields = [field for field in schema if field in self.rename_map]
+        other_fields = self.rename_map.keys() - set(schema_fields)
+        return [
+            *schema_fields,
+            *(field for field in self.rename_map if field in other_fields),
+        ]
+
+    def convert(self, rows, fields=None):
+        """
+        Convert documents to a DataFrame of the target schema, with None for null values
+
+        - **rows**: List of source documents
+        - **fields**: Mapped source fields to convert, in column order (all by default)
+        """
+        if fields is None:
+            fields = self.get_fields()
+
+        df = pd.DataFrame(
+            {
+                field: pd.Series([row.get(field) for row in rows], dtype=object)
+                for field in fields
+            }
+        )
+
+        for field, (preprocess_func, args) in self.preprocess_map.items():
+            if field in df.columns:
+                df[field] = preprocess_func(df[field], *args)
+        for field, (conversion_func, args) in self.conversion_map.items():
+            if field in df.columns:
+                df[field] = conversion_func(df[field], *args)
+
+        return df.rename(columns=self.rename_map)
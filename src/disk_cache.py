@@ -0,0 +1,236 @@
+import asyncio
+import datetime
+import fcntl
+import logging
+import os
+import threading
+import time
+import ujson
+
+from settings import settings
+
+exc_logger = logging.getLogger("exc_logger")
+query_logger = logging.getLogger("query_logger")
+
+# Bounded file cache under settings.cache_path. Files of one query ID form a single
+# entry, evicted least recently used first once a budget is exceeded. Reads touch the
+# entry's mtime, so access times are shared between workers through the file system.
+# Counters are kept per worker and added to a shared stats file at each sweep interval
+_STATS_LOCK = threading.Lock()
+_STATS = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+_STATS_FILE = ".stats.json"
+_SWEEP_LOCK_FILE = ".sweep.lock"
+
+# Summary caches are pre-generated by tools/generateSummaryCache.py for a fixed list of
+# queries and are never evicted, but still count towards the size budget
+_PINNED_SUFFIXES = (".summary.txt", ".summary.metadata.json")
+_METADATA_SUFFIX = ".metadata.json"
+
+###
+# Access Tracking
+###
+
+
+def touch(cache_file):
+    try:
+        os.utime(cache_file)
+    except OSError:
+        pass
+
+
+def record_hit(cache_file):
+    with _STATS_LOCK:
+        _STATS["hits"] += 1
+
+    touch(cache_file)
+
+
+def record_miss():
+    with _STATS_LOCK:
+        _STATS["misses"] += 1
+
+
+###
+# Sweeper
+###
+
+
+def _get_entry_created(path, fallback):
+    try:
+        with open(path) as fp:
+            created = ujson.load(fp)["created"]
+        return datetime.datetime.fromisoformat(created).timestamp()
+    except (OSError, KeyError, TypeError, ValueError):
+        return fallback
+
+
+def _scan_entries():
+    entries = {}
+    pinned_size = 0
+
+    try:
+        files = list(os.scandir(settings.cache_path))
+    except FileNotFoundError:
+        return entries, pinned_size
+
+    for file in files:
+        try:
+            stat = file.stat()
+        except FileNotFoundError:
+            continue
+
+        # Stats and lock files, and files still being written
+        if (
+            not file.is_file()
+            or file.name.startswith(".")
+            or file.name.endswith(".tmp")
+        ):
+            continue
+
+        if file.name.endswith(_PINNED_SUFFIXES):
+            pinned_size += stat.st_size
+            continue
+
+        query_id = file.name.split(".", 1)[0]
+        entry = entries.setdefault(
+            query_id,
+            {"files": [], "size": 0, "accessed": 0, "created": None},
+        )
+        entry["files"].append(file.path)
+        entry["size"] += stat.st_size
+        entry["accessed"] = max(entry["accessed"], stat.st_mtime)
+
+        if file.name == f"{query_id}{_METADATA_SUFFIX}":
+            entry["created"] = _get_entry_created(file.path, stat.st_mtime)
+
+    for entry in entries.values():
+        if entry["created"] is None:
+            entry["created"] = entry["accessed"]
+
+    return entries, pinned_size
+
+
+def _remove_entry(entry):
+    for path in entry["files"]:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def _flush_stats():
+    # Adds this worker's counters to the shared stats file and returns its totals
+    with _STATS_LOCK:
+        stats = dict(_STATS)
+        _STATS.update(dict.fromkeys(_STATS, 0))
+
+    os.makedirs(settings.cache_path, exist_ok=True)
+    with open(os.path.join(settings.cache_path, _STATS_FILE), "a+") as fp:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        fp.seek(0)
+        try:
+            shared_stats = ujson.load(fp)
+        except ValueError:
+            shared_stats = {}
+
+        for name, value in stats.items():
+            stats[name] = shared_stats.get(name, 0) + value
+
+        fp.seek(0)
+        fp.truncate()
+        ujson.dump(stats, fp)
+
+    return stats
+
+
+def sweep():
+    entries, pinned_size = _scan_entries()
+    now = time.time()
+
+    expired = [
+        query_id
+        for query_id, entry in entries.items()
+        if now - entry["created"] > settings.cache_ttl
+    ]
+    for query_id in expired:
+        _remove_entry(entries.pop(query_id))
+
+    size = pinned_size + sum(entry["size"] for entry in entries.values())
+    evicted = 0
+    for query_id, entry in sorted(entries.items(), key=lambda e: e[1]["accessed"]):
+        if (
+            size <= settings.cache_max_bytes
+            and len(entries) <= settings.cache_max_entries
+        ):
+            break
+
+        _remove_entry(entries.pop(query_id))
+        size -= entry["size"]
+        evicted += 1
+
+    with _STATS_LOCK:
+        _STATS["expired"] += len(expired)
+        _STATS["evicted"] += evicted
+
+    query_logger.info(
+        f"Cache sweep - {len(expired)} expired, {evicted} evicted, {len(entries)} entries, {size} bytes"
+    )
+
+
+def _sweep_once():
+    # One worker sweeps per interval, the lock file holding the last sweep time
+    os.makedirs(settings.cache_path, exist_ok=True)
+    with open(os.path.join(settings.cache_path, _SWEEP_LOCK_FILE), "a+") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+
+        lock.seek(0)
+        try:
+            swept = float(lock.read())
+        except ValueError:
+            swept = float("-inf")
+
+        if time.time() - swept < settings.cache_sweep_interval:
+            return
+
+        try:
+            sweep()
+        finally:
+            lock.seek(0)
+            lock.truncate()
+            lock.write(str(time.time()))
+
+
+async def run_sweeper():
+    while True:
+        try:
+            await asyncio.to_thread(_sweep_once)
+            await asyncio.to_thread(_flush_stats)
+        except Exception:
+            exc_logger.exception("Cache sweep failed")
+
+        await asyncio.sleep(settings.cache_sweep_interval)
+
+
+###
+# Reporting
+###
+
+
+def get_cache_stats():
+    entries, pinned_size = _scan_entries()
+
+    stats = _flush_stats()
+    lookups = stats["hits"] + stats["misses"]
+
+    return {
+        "entries": len(entries),
+        "size": pinned_size + sum(entry["size"] for entry in entries.values()),
+        "pinned_size": pinned_size,
+        "max_entries": settings.cache_max_entries,
+        "max_size": settings.cache_max_bytes,
+        "hit_ratio": stats["hits"] / lookups if lookups else None,
+        **stats,
+    }
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import httpx
+
+from settings import settings
+
+# Shared HTTP clients, one keep-alive pool per upstream, opened and closed with the
+# app lifespan. Route handlers receive them through the FastAPI dependencies below
+_CLIENTS = {}
+_LATENCY_LOCK = threading.Lock()
+_LATENCY = {}
+
+
+def _get_upstreams():
+    return {
+        "caos": {"base_url": settings.caos_url, "timeout": settings.caos_timeout},
+        "wikipedia": {
+            "base_url": "https://en.wikipedia.org",
+            "timeout": settings.wikipedia_timeout,
+        },
+    }
+
+
+###
+# Latency Metrics
+###
+
+
+async def _start_timer(request):
+    request.extensions["start_time"] = time.perf_counter()
+
+
+def _record_latency(upstream):
+    async def record_latency(response):
+        # Time to response headers, as the body may be streamed by the caller
+        elapsed = time.perf_counter() - response.request.extensions["start_time"]
+
+        with _LATENCY_LOCK:
+            latency = _LATENCY.setdefault(
+                upstream, {"requests": 0, "errors": 0, "total": 0.0, "max": 0.0}
+            )
+            latency["requests"] += 1
+            latency["errors"] += response.is_error
+            latency["total"] += elapsed
+            latency["max"] = max(latency["max"], elapsed)
+
+    return record_latency
+
+
+def get_http_client_stats():
+    with _LATENCY_LOCK:
+        return {
+            upstream: {
+                **latency,
+                "mean": latency["total"] / latency["requests"],
+            }
+            for upstream, latency in _LATENCY.items()
+        }
+
+
+###
+# Client Registry
+###
+
+
+def _create_http_client(upstream):
+    config = _get_upstreams()[upstream]
+
+    return httpx.AsyncClient(
+        base_url=config["base_url"],
+        timeout=httpx.Timeout(config["timeout"], connect=settings.http_connect_timeout),
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+        ),
+        event_hooks={
+            "request": [_start_timer],
+            "response": [_record_latency(upstream)],
+        },
+    )
+
+
+def get_http_client(upstream):
+    # Created on first use when the lifespan has not opened it (e.g. in tools)
+    if (client := _CLIENTS.get(upstream)) is None or client.is_closed:
+        client = _CLIENTS[upstream] = _create_http_client(upstream)
+
+    return client
+
+
+async def open_http_clients():
+    for upstream in _get_upstreams():
+        get_http_client(upstream)
+
+
+async def close_http_clients():
+    clients = list(_CLIENTS.values())
+    _CLIENTS.clear()
+
+    for client in clients:
+        await client.aclose()
+
+
+###
+# Dependencies
+###
+
+
+def get_caos_client():
+    return get_http_client("caos")
+
+
+def get_wikipedia_client():
+    return get_http_client("wikipedia")
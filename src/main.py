@@ -3,9 +3,11 @@ from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
 from settings import settings
-from util import get_offline_switch
+from util import collect_retired_data_releases, get_offline_switch
 
+import asyncio
 import logging.config
+from contextlib import asynccontextmanager
 import time
 import traceback
 
@@ -17,6 +19,7 @@ from services import (
     query,
     query_parse,
     query_preprocessor,
+    search,
     summary,
     documents,
     ancillary,
@@ -45,8 +48,43 @@ from views import (
     templates,
     theme,
 )
-
-app = FastAPI(docs_url="/api/docs", redoc_url="/api/redoc", title="BOLD Portal")
+import adao
+import disk_cache
+import http_clients
+import term_index
+
+
+async def run_data_release_collector():
+    while True:
+        try:
+            await asyncio.to_thread(collect_retired_data_releases)
+        except Exception:
+            exc_logger.error(traceback.format_exc())
+
+        await asyncio.sleep(settings.cache_sweep_interval)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await adao.connect_cb_cluster()
+    await http_clients.open_http_clients()
+    cache_sweeper = asyncio.create_task(disk_cache.run_sweeper())
+    data_release_collector = asyncio.create_task(run_data_release_collector())
+    term_index_loader = asyncio.create_task(term_index.run_term_index_loader())
+    yield
+    term_index_loader.cancel()
+    data_release_collector.cancel()
+    cache_sweeper.cancel()
+    await http_clients.close_http_clients()
+    await adao.close_cb_cluster()
+
+
+app = FastAPI(
+    docs_url="/api/docs",
+    redoc_url="/api/redoc",
+    title="BOLD Portal",
+    lifespan=lifespan,
+)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.mount("/wp-content", StaticFiles(directory="static/wp-content"), name="wp-content")
 app.mount(
@@ -60,6 +98,7 @@ api_router = APIRouter(prefix="/api")
 api_router.include_router(query.route)
 api_router.include_router(query_parse.route)
 api_router.include_router(query_preprocessor.route)
+api_router.include_router(search.route)
 api_router.include_router(terms.route)
 api_router.include_router(summary.route)
 api_router.include_router(documents.route)
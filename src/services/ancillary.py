@@ -6,10 +6,12 @@ import sys
 import ujson
 
 try:
+    import adao
     import dao
     import util
 except ImportError:
     sys.path.append(pathlib.Path(__file__).parent.parent.resolve().as_posix())
+    import adao
     import dao
     import util
 
@@ -69,6 +71,18 @@ async def retrieve_ancillary_documents(
     to select a set of documents from the specified collection. If a collection that does not exist
     is specified or no documents with the selected key matches the value(s) no documents are returned.
 
+    - **collection**: Collection name to retrieve from
+    - **key**: Field to query within documents of collection
+    - **values**: Values to match to key within document, as semicolon delimited values
+    - **fields**: Fields to select, as semicolon delimited values
+    """
+    return await get_ancillary_documents(collection, key, values, fields)
+
+
+async def get_ancillary_documents(collection, key, values, fields=None):
+    """
+    Retrieve ancillary documents matching a key, as served by `/api/ancillary`
+
     - **collection**: Collection name to retrieve from
     - **key**: Field to query within documents of collection
     - **values**: Values to match to key within document, as semicolon delimited values
@@ -89,7 +103,7 @@ async def retrieve_ancillary_documents(
     ancillary_join_key = join_map[collection]["join_key"]
     derived_join_key = join_map[collection]["derived_join_key"]
 
-    documents = dao.get_cb_ancillary_documents(
+    documents = await adao.get_cb_ancillary_documents(
         ancillary_collection,
         derived_collection,
         ancillary_join_key,
@@ -135,7 +149,7 @@ async def retrieve_ancillary_documents(
     # TEMP: To display 100 random taxonomies for landing page table
     # TODO: Refine query for production use
     if collection == "taxonomies":
-        documents = dao.get_cb_ancillary_taxonomy_documents(100)
+        documents = await adao.get_cb_ancillary_taxonomy_documents(100)
     else:
         ancillary_collection = collection
         derived_collection = join_map[collection]["derived_collection"]
@@ -157,7 +171,7 @@ async def retrieve_ancillary_documents(
         if ancillary_doc := util.get_cache_from_meta_ids([ancillary_id])[0]:
             documents = ujson.loads(ancillary_doc)
         else:
-            documents = dao.get_cb_ancillary_documents(
+            documents = await adao.get_cb_ancillary_documents(
                 ancillary_collection,
                 derived_collection,
                 ancillary_join_key,
@@ -5,10 +5,12 @@ import pathlib
 import sys
 
 try:
+    import adao
     import dao
     import util
 except ImportError:
     sys.path.append(pathlib.Path(__file__).parent.parent.resolve().as_posix())
+    import adao
     import dao
     import util
 
@@ -34,6 +36,6 @@ async def generate_metadata_counts(
     """
     triplets = util.sanitize_triplets_from_query(query)
 
-    counts = dao.get_cb_counts(triplets)
+    counts = await adao.get_cb_counts(triplets)
 
     return counts
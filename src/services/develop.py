@@ -3,7 +3,10 @@ from typing import Any, Dict
 from fastapi import APIRouter, Query
 from pydantic import BaseModel
 
-from dao import _get_cb_cluster
+from dao import _get_cb_cluster, get_prepared_statement_stats
+from disk_cache import get_cache_stats
+from http_clients import get_http_client_stats
+from term_index import get_term_index_stats
 
 route = APIRouter(tags=["upsert"])
 
@@ -40,3 +43,23 @@ async def retrieve_data_by_value(bucket: str, collection: str, field: str, value
         documents.append(row)
 
     return documents
+
+
+@route.get("/develop/prepared_statements", include_in_schema=False)
+async def retrieve_prepared_statement_stats():
+    return get_prepared_statement_stats()
+
+
+@route.get("/develop/cache_stats", include_in_schema=False)
+def retrieve_cache_stats():
+    return get_cache_stats()
+
+
+@route.get("/develop/http_clients", include_in_schema=False)
+async def retrieve_http_client_stats():
+    return get_http_client_stats()
+
+
+@route.get("/develop/term_index", include_in_schema=False)
+async def retrieve_term_index_stats():
+    return get_term_index_stats()
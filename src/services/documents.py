@@ -1,24 +1,36 @@
-from fastapi import APIRouter, Path, Query, HTTPException, status
+from couchbase.exceptions import DocumentNotFoundException
+from fastapi import APIRouter, HTTPException, Path, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse, StreamingResponse
-from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from typing import List, Dict
 
-import pandas as pd
+import csv
+import functools
+import io
+import operator
 import pathlib
 import os
-import subprocess
+import queue
 import sys
-import tempfile
+import threading
 import ujson
+import zlib
+import zstandard
 
 try:
+    import adao
     import dao
+    import data_map
     import util
+    from settings import settings
 except ImportError:
     sys.path.append(pathlib.Path(__file__).parent.parent.resolve().as_posix())
+    import adao
     import dao
+    import data_map
     import util
+    from settings import settings
 
 route = APIRouter(tags=["documents"])
 
@@ -29,21 +41,125 @@ class Documents(BaseModel):
     recordsFiltered: int
 
 
+class DocumentsPage(BaseModel):
+    data: List[Dict]
+    recordsTotal: int
+    next_cursor: str | None
+
+
 # TODO: Integrate util.py to fetch these values, functions
 _DL_BATCH_SIZE = 10000
 _DL_MAX_SIZE = 1000000
-_DWC_TOOL = os.path.join(util.APP_ROOT, "tools", "dataMapConverter.py")
+_DL_PREFETCH_POLL = 1  # Seconds between checks that a blocked download is still read
+_DL_END = object()
 _DWC_MAP = os.path.join(util.DATA_MODEL_PATH, "mapping_BCDM_to_DWC.tsv")
 
+# Download encodings: file extension, attachment media type and compressor factory.
+# The level bounds the CPU spent compressing a download
+_DL_ENCODINGS = {
+    "gzip": (
+        "gz",
+        "application/gzip",
+        lambda: zlib.compressobj(
+            settings.download_codec_level, zlib.DEFLATED, zlib.MAX_WBITS | 16
+        ),
+    ),
+    "zstd": (
+        "zst",
+        "application/zstd",
+        lambda: zstandard.ZstdCompressor(settings.download_codec_level).compressobj(),
+    ),
+}
+
+
+@functools.cache
+def _get_dwc_converter():
+    # Compiled once per process from the BCDM to DWC map
+    return data_map.DataMapConverter(_DWC_MAP)
+
 
-def _delete_tmp_files(tmp_files):
+def _get_total_count(query_id, bucket, collection):
+    if (total_count := util.get_cache_count_from_query_id(query_id)) is None:
+        triplets = util.get_triplets_from_query_id(query_id)
+        meta_ids = dao.get_cb_meta_ids(triplets, bucket, collection)
+        util.write_cache_with_query_id(query_id, meta_ids)
+        total_count = len(meta_ids)
+
+    return total_count
+
+
+def _parse_fields(fields):
     """
-    Delete temporary files in module using os.remove
+    Parse a comma-separated list of BCDM fields, raising a 400 error for unknown fields
+
+    - **fields**: Comma-separated field names, or None for every field
 
-    - **tmp_files**: List of files to delete
+    Returns: tuple of fields in the requested order, or None for every field
     """
-    for tmp_file in tmp_files:
-        os.remove(tmp_file)
+    if not fields:
+        return None
+
+    fields = tuple(dict.fromkeys(filter(None, map(str.strip, fields.split(",")))))
+    schema_fields = set(util.get_data_model_schema())
+    if unknown_fields := [field for field in fields if field not in schema_fields]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown_fields)}",
+        )
+
+    return fields or None
+
+
+def _project_row(document, fields):
+    return {field: document.get(field) for field in fields}
+
+
+def _get_data_model_rows(meta_ids, bucket, collection, fields=None):
+    # Projected rows only fetch their fields on a cache miss, and are not cached as
+    # they are partial documents
+    if fields is None:
+        build_row = util.build_data_model_row
+    else:
+        build_row = functools.partial(_project_row, fields=fields)
+
+    rows = []
+    results = util.get_cache_from_meta_ids(meta_ids)
+
+    missing_results = {}
+    for idx, (meta_id, result) in enumerate(zip(meta_ids, results)):
+        if result is None:
+            rows.append(result)
+            missing_results[meta_id] = idx
+        else:
+            rows.append(build_row(ujson.loads(result)))
+
+    if missing_results:
+        missing_meta_ids = list(missing_results.keys())
+        if fields is None:
+            missing_docs = dao.get_cb_documents(missing_meta_ids, bucket, collection)
+        else:
+            missing_docs = dao.get_cb_document_fields(
+                missing_meta_ids, fields, bucket, collection
+            )
+
+        docs_to_cache = {}
+        for meta_id, missing_doc in zip(missing_meta_ids, missing_docs):
+            if fields is None:
+                docs_to_cache[meta_id] = ujson.dumps(missing_doc, default=str)
+            rows[missing_results[meta_id]] = build_row(missing_doc)
+
+        if docs_to_cache:
+            util.write_cache_with_meta_ids(docs_to_cache)
+
+    return rows
+
+
+def _get_rows(meta_ids, total_count, bucket, collection, fields=None):
+    rows = _get_data_model_rows(meta_ids, bucket, collection, fields)
+    for data in rows:
+        data["count"] = total_count
+
+    return rows
 
 
 @route.get(
@@ -55,6 +171,7 @@ def retrieve_documents(
     query_id: str = Path(title="Documents query ID"),
     length: int = Query(default=1, title="Documents limit", ge=0),
     start: int = Query(default=0, title="Documents offset", ge=0),
+    fields: str = Query(default=None, title="Comma-separated document fields"),
 ):
     """
     Retrieve a set of documents IDs from an encoded query (query_id) and fetch a set
@@ -64,51 +181,114 @@ def retrieve_documents(
     - **query_id**: Encoded triplets query from `/api/query`
     - **length**: Number of documents to retrieve (minimum 0)
     - **start**: Offset of documents from beginning of documents in query (minimum 0)
+    - **fields**: Comma-separated BCDM fields to return (e.g. `processid,species`), omit for every field
     """
-    triplets = util.get_triplets_from_query_id(query_id)
+    return get_documents(query_id, length, start, _parse_fields(fields))
+
+
+def get_documents(query_id, length=1, start=0, fields=None):
+    """
+    Retrieve a slice of the documents of an encoded query, as served by `/api/documents/{query_id}`
 
+    - **query_id**: Encoded triplets query from `/api/query`
+    - **length**: Number of documents to retrieve
+    - **start**: Offset of documents from beginning of documents in query
+    - **fields**: Sequence of BCDM fields to return, None for every field
+    """
     cb_data = "primary_data"
     bucket = dao.NAME_MAP[cb_data]["bucket"]
     collection = dao.NAME_MAP[cb_data]["collection"]
 
-    if not (meta_ids := util.get_cache_from_query_id(query_id)):
-        meta_ids = dao.get_cb_meta_ids(triplets, bucket, collection)
-        util.write_cache_with_query_id(query_id, meta_ids)
+    total_count = _get_total_count(query_id, bucket, collection)
+    meta_ids = util.get_cache_slice_from_query_id(query_id, start, length)
+    rows = _get_rows(meta_ids, total_count, bucket, collection, fields)
 
-    total_count = len(meta_ids)
-    default_object = util.get_default_data_model_object()
+    return {"data": rows, "recordsTotal": total_count, "recordsFiltered": total_count}
 
-    rows = []
-    meta_ids.sort()
-    meta_ids = meta_ids[start : start + length]
-    results = util.get_cache_from_meta_ids(meta_ids)
 
-    missing_results = {}
-    for idx, (meta_id, result) in enumerate(zip(meta_ids, results)):
-        if result is None:
-            rows.append(result)
-            missing_results[meta_id] = idx
-        else:
-            data = default_object.copy()
-            data.update(ujson.loads(result))
-            data["count"] = total_count
-            rows.append(data)
+def _get_record_rows(processid, record_ids, query_id, bucket, collection):
+    # The index lags behind primary data until the ETL catches up, so records it lists
+    # that are gone or no longer of the processid make it stale (None). Only the
+    # records of a current entry are written as the query cache
+    try:
+        rows = _get_rows(record_ids, len(record_ids), bucket, collection)
+    except DocumentNotFoundException:
+        return None
 
-    if missing_results:
-        docs_to_cache = {}
-        missing_meta_ids = list(missing_results.keys())
-        missing_docs = dao.get_cb_documents(missing_meta_ids, bucket, collection)
-        for meta_id, missing_doc in zip(missing_meta_ids, missing_docs):
-            docs_to_cache[meta_id] = ujson.dumps(missing_doc, default=str)
+    if any(row.get("processid") != processid for row in rows):
+        return None
 
-            data = default_object.copy()
-            data.update(missing_doc)
-            data["count"] = total_count
-            rows[missing_results[meta_id]] = data
+    if util.get_cache_count_from_query_id(query_id) is None:
+        util.write_cache_with_query_id(query_id, record_ids)
 
-        util.write_cache_with_meta_ids(docs_to_cache)
+    return rows
 
-    return {"data": rows, "recordsTotal": total_count, "recordsFiltered": total_count}
+
+async def get_record_documents(processid, extent="limited"):
+    """
+    Retrieve the documents of a record by key from the processid index maintained by the
+    ETL, instead of querying primary data. The query cache of the record is written so
+    its query ID can be used with the other endpoints
+
+    - **processid**: Record processid
+    - **extent**: Document extent of the record query
+
+    Returns: dict with query_id and data, or None if the processid is not indexed or
+    its index entry is stale
+    """
+    if not (record_ids := await adao.get_cb_record_ids(processid)):
+        return None
+
+    cb_data = "primary_data"
+    bucket = dao.NAME_MAP[cb_data]["bucket"]
+    collection = dao.NAME_MAP[cb_data]["collection"]
+
+    triplets = util.sanitize_triplets_from_query(f"ids:processid:{processid}", extent)
+    query_id = util.generate_query_id_from_triplets(triplets)
+
+    # Documents and query cache are read and written off the event loop
+    rows = await run_in_threadpool(
+        _get_record_rows, processid, record_ids, query_id, bucket, collection
+    )
+    if rows is None:
+        return None
+
+    return {"query_id": query_id, "data": rows}
+
+
+@route.get(
+    "/documents/{query_id}/page",
+    response_model=DocumentsPage,
+    response_description="Document Set, Paged By Cursor",
+)
+def retrieve_documents_page(
+    query_id: str = Path(title="Documents query ID"),
+    length: int = Query(default=1, title="Documents limit", ge=0),
+    cursor: str = Query(default=None, title="Cursor from the previous page"),
+    fields: str = Query(default=None, title="Comma-separated document fields"),
+):
+    """
+    Retrieve a page of documents from an encoded query (query_id) using keyset pagination.
+    Documents are ordered by ID and each page starts after the `cursor` returned with the
+    previous page, so deep pages cost the same as the first one.
+
+    - **query_id**: Encoded triplets query from `/api/query`
+    - **length**: Number of documents to retrieve (minimum 0)
+    - **cursor**: `next_cursor` of the previous page, omit to start from the first document
+    - **fields**: Comma-separated BCDM fields to return (e.g. `processid,species`), omit for every field
+    """
+    fields = _parse_fields(fields)
+
+    cb_data = "primary_data"
+    bucket = dao.NAME_MAP[cb_data]["bucket"]
+    collection = dao.NAME_MAP[cb_data]["collection"]
+
+    total_count = _get_total_count(query_id, bucket, collection)
+    meta_ids = util.get_cache_page_after_from_query_id(query_id, cursor, length)
+    rows = _get_rows(meta_ids, total_count, bucket, collection, fields)
+
+    next_cursor = meta_ids[-1] if len(meta_ids) == length and meta_ids else None
+    return {"data": rows, "recordsTotal": total_count, "next_cursor": next_cursor}
 
 
 @route.get(
@@ -133,25 +313,40 @@ async def retrieve_documents_query(
     response_class=FileResponse,
     responses={
         200: {
-            "content": {"text/plain": {}, "text/tab-separated-values": {}},
+            "content": {
+                "text/plain": {},
+                "text/tab-separated-values": {},
+                "application/gzip": {},
+                "application/zstd": {},
+            },
             "description": "Document Export",
         },
     },
 )
 def retrieve_documents_download(
+    request: Request,
     query_id: str = Path(title="Documents query ID"),
     format: str = Query(
         default="json", title="Download format", regex="(dwc|tsv|json)"
     ),
+    compress: str = Query(
+        default=None, title="Compressed attachment", regex="(gzip|zstd)"
+    ),
+    fields: str = Query(default=None, title="Comma-separated document fields"),
 ):
     """
     Generate a download file with documents from an encoded query (query_id). Will download up to a
     maximum of `DL_MAX_SIZE` documents for a given query and will ignore the query extent to always
-    download the full extent.
+    download the full extent. The download is compressed with the encoding preferred in the
+    `Accept-Encoding` header (zstd or gzip), unless `compress` is set.
 
     - **query_id**: Encoded triplets query from `/api/query`
     - **format**: Export format, available options are `dwc` (Darwin Core Model), `tsv` and `json`
+    - **compress**: Download as a compressed `.gz` (gzip) or `.zst` (zstd) attachment instead
+    - **fields**: Comma-separated BCDM fields to download, in column order for `tsv`, omit for every field
     """
+    fields = _parse_fields(fields)
+
     triplets = util.get_triplets_from_query_id(query_id)
     triplets[-1] = "full"  # Always consider the full set of downloads
 
@@ -160,109 +355,182 @@ def retrieve_documents_download(
     collection = dao.NAME_MAP[cb_data]["collection"]
 
     meta_ids = dao.get_cb_meta_ids(triplets, bucket, collection)[:_DL_MAX_SIZE]
-    default_object = util.get_default_data_model_object()
+    batches = _prefetch_batches(
+        _iter_download_batches(meta_ids, bucket, collection, fields),
+        settings.download_prefetch_depth,
+    )
 
     if format == "dwc":
-        media_type = "text/plain"
+        chunks, media_type, extension = _iter_dwc(batches, fields), "text/plain", "txt"
     elif format == "tsv":
-        media_type = "text/tab-separated-values"
+        chunks, media_type, extension = (
+            _iter_tsv(batches, fields),
+            "text/tab-separated-values",
+            "tsv",
+        )
     else:
-        media_type = "text/plain"
-
-    tmp_to_delete = []
-
-    def iter_file():
-        batch_counter = 0
-        batch = meta_ids[
-            _DL_BATCH_SIZE * batch_counter : _DL_BATCH_SIZE * (batch_counter + 1)
-        ]
-
-        while batch:
-            rows = []
-            results = util.get_cache_from_meta_ids(batch)
-
-            # TODO: If general exception occurs, how will this file be cleaned up?
-            tmp_cache_file = tempfile.NamedTemporaryFile(mode="r+", delete=False)
-            tmp_to_delete.append(tmp_cache_file.name)
-
-            missing_results = {}
-            for idx, (meta_id, result) in enumerate(zip(batch, results)):
-                if result is None:
-                    rows.append(result)
-                    missing_results[meta_id] = idx
-                else:
-                    data = default_object.copy()
-                    data.update(ujson.loads(result))
-                    rows.append(data)
-
-            if missing_results:
-                docs_to_cache = {}
-                missing_meta_ids = list(missing_results.keys())
-                missing_docs = dao.get_cb_documents(
-                    missing_meta_ids, bucket, collection
-                )
-                for meta_id, missing_doc in zip(missing_meta_ids, missing_docs):
-                    docs_to_cache[meta_id] = ujson.dumps(missing_doc, default=str)
-
-                    data = default_object.copy()
-                    data.update(missing_doc)
-                    rows[missing_results[meta_id]] = data
-
-                util.write_cache_with_meta_ids(docs_to_cache)
-
-            for data in rows:
-                tmp_cache_file.write(ujson.dumps(data, default=str) + "\n")
-
-            if format == "dwc":
-                tmp_cache_file.close()
-
-                tmp_dwc_file = tempfile.NamedTemporaryFile(delete=False)
-                tmp_dwc_file.close()
-                tmp_to_delete.append(tmp_dwc_file.name)
-
-                try:
-                    subprocess.run(
-                        [
-                            sys.executable,
-                            _DWC_TOOL,
-                            "-i",
-                            tmp_cache_file.name,
-                            "-o",
-                            tmp_dwc_file.name,
-                            "-m",
-                            _DWC_MAP,
-                        ],
-                        check=True,
-                    )
-                except subprocess.CalledProcessError:
-                    _delete_tmp_files(tmp_to_delete)
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail="DWC file failed to generate, please try again",
-                    )
-
-                yield pd.read_json(tmp_dwc_file.name, lines=True).to_csv(
-                    header=(batch_counter == 0), index=False, sep="\t"
-                )
-
-            elif format == "tsv":
-                tmp_cache_file.close()
-                yield pd.read_json(tmp_cache_file.name, lines=True).to_csv(
-                    header=(batch_counter == 0), index=False, sep="\t"
-                )
-
-            else:
-                tmp_cache_file.seek(0)
-                yield from tmp_cache_file
-                tmp_cache_file.close()
-
-            batch_counter += 1
-            batch = meta_ids[
-                _DL_BATCH_SIZE * batch_counter : _DL_BATCH_SIZE * (batch_counter + 1)
-            ]
+        chunks, media_type, extension = _iter_ndjson(batches), "text/plain", "json"
+
+    headers = {"Vary": "Accept-Encoding"}
+    if compress:
+        encoding = compress
+        encoding_extension, media_type, _ = _DL_ENCODINGS[encoding]
+        headers["Content-Disposition"] = (
+            f'attachment; filename="{query_id}.{extension}.{encoding_extension}"'
+        )
+    elif encoding := _negotiate_download_encoding(
+        request.headers.get("accept-encoding", "")
+    ):
+        headers["Content-Encoding"] = encoding
+    else:
+        return StreamingResponse(chunks, media_type=media_type, headers=headers)
 
     return StreamingResponse(
-        iter_file(),
-        media_type=media_type,
-        background=BackgroundTask(_delete_tmp_files, tmp_to_delete),
+        _compress_chunks(chunks, encoding), media_type=media_type, headers=headers
     )
+
+
+###
+# Download Exporters
+###
+
+
+def _iter_download_batches(meta_ids, bucket, collection, fields=None):
+    # Only one batch of documents is held in memory at a time
+    for start in range(0, len(meta_ids), _DL_BATCH_SIZE):
+        yield _get_data_model_rows(
+            meta_ids[start : start + _DL_BATCH_SIZE], bucket, collection, fields
+        )
+
+
+def _prefetch_batches(batches, depth):
+    # Batches are fetched in a thread up to `depth` ahead of the one being encoded and
+    # sent. The queue is only drained as the client reads, so a slow client blocks the
+    # fetching instead of buffering the download in memory
+    if depth < 1:
+        yield from batches
+        return
+
+    prefetched = queue.Queue(maxsize=depth)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                prefetched.put(item, timeout=_DL_PREFETCH_POLL)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def fetch_batches():
+        try:
+            for rows in batches:
+                if not put((rows, None)):
+                    return
+        except Exception as exc:
+            put((None, exc))
+        else:
+            put((_DL_END, None))
+
+    threading.Thread(target=fetch_batches, daemon=True).start()
+    try:
+        while True:
+            rows, exc = prefetched.get()
+            if exc is not None:
+                raise exc
+            elif rows is _DL_END:
+                return
+
+            yield rows
+    finally:
+        # Stops the fetching when the download fails or the client disconnects
+        stopped.set()
+
+
+def _negotiate_download_encoding(accept_encoding):
+    # Supported encoding with the highest weight in Accept-Encoding. zstd compresses
+    # faster for a similar size, so it is preferred on ties
+    weights = {}
+    for coding in accept_encoding.lower().split(","):
+        name, _, params = coding.partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip()] = weight
+
+    default_weight = weights.get("*", 0.0)
+    encoding = max(
+        _DL_ENCODINGS,
+        key=lambda encoding: (
+            weights.get(encoding, default_weight),
+            encoding == "zstd",
+        ),
+        default=None,
+    )
+    if encoding is None or weights.get(encoding, default_weight) <= 0:
+        return None
+
+    return encoding
+
+
+def _compress_chunks(chunks, encoding):
+    # One compressed chunk per encoded batch, so the stream stays incremental
+    _, _, create_compressor = _DL_ENCODINGS[encoding]
+    compressor = create_compressor()
+
+    for chunk in chunks:
+        if compressed := compressor.compress(chunk.encode()):
+            yield compressed
+
+    yield compressor.flush()
+
+
+def _iter_ndjson(batches):
+    for rows in batches:
+        yield "".join(f"{ujson.dumps(data, default=str)}\n" for data in rows)
+
+
+def _write_tsv(rows):
+    # None is written as an empty cell and other values as their string, as pandas did
+    buffer = io.StringIO()
+    csv.writer(buffer, delimiter="\t", lineterminator="\n").writerows(rows)
+    return buffer.getvalue()
+
+
+def _get_values_getter(fields):
+    # itemgetter returns a bare value rather than a tuple for a single field
+    if len(fields) == 1:
+        return lambda data: (data[fields[0]],)
+
+    return operator.itemgetter(*fields)
+
+
+def _iter_tsv(batches, fields=None):
+    # Columns follow the BCDM schema (or the requested fields), so every batch matches
+    # the header
+    fields = fields or util.get_data_model_schema()
+    get_values = _get_values_getter(fields)
+
+    yield _write_tsv([fields])
+    for rows in batches:
+        yield _write_tsv(map(get_values, rows))
+
+
+def _iter_dwc(batches, fields=None):
+    converter = _get_dwc_converter()
+    if fields is None:
+        fields = converter.get_fields(util.get_data_model_schema())
+    else:
+        fields = [field for field in fields if field in converter.rename_map]
+
+    yield _write_tsv([[converter.rename_map[field] for field in fields]])
+    for rows in batches:
+        dwc_df = converter.convert(rows, fields)
+        yield _write_tsv(dwc_df.itertuples(index=False, name=None))
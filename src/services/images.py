@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Path, Query
+from fastapi import APIRouter, Depends, Path, Query
 from pydantic import BaseModel
 from typing import Dict, List
 
@@ -11,11 +11,15 @@ from collections import defaultdict
 from functools import partial
 
 try:
+    import adao
     import dao
+    import http_clients
     import util
 except ImportError:
     sys.path.append(pathlib.Path(__file__).parent.parent.resolve().as_posix())
+    import adao
     import dao
+    import http_clients
     import util
 
 route = APIRouter(tags=["images"])
@@ -164,6 +168,7 @@ async def generate_images_summary(
     assorted_subtaxa: bool = Query(
         False, title="Select images based on subsampling each subtaxa"
     ),
+    caos_client: httpx.AsyncClient = Depends(http_clients.get_caos_client),
 ):
     """
     Retrieve a set of image metadata and image URLs from an encoded query (query_id). Selects a random
@@ -174,6 +179,20 @@ async def generate_images_summary(
     - **assorted_subtaxa**: Use taxon in query to select diverse set of images of subtaxa;
         Must have single taxonomy triplet in query
     """
+    return await summarize_images(query_id, max_images, assorted_subtaxa, caos_client)
+
+
+async def summarize_images(
+    query_id, max_images=-1, assorted_subtaxa=False, caos_client=None
+):
+    """
+    Select image metadata for an encoded query, as served by `/api/images/{query_id}`
+
+    - **query_id**: Encoded triplets query from `/api/query`
+    - **max_images**: Maximum number of images returned, set to `IMG_LIMIT` if max_images < 0
+    - **assorted_subtaxa**: Use taxon in query to select diverse set of images of subtaxa
+    - **caos_client**: Shared CAOS client, taken from the registry if not given
+    """
     triplets = util.get_triplets_from_query_id(query_id)
     fields = ["processid", "identification"]
 
@@ -199,7 +218,9 @@ async def generate_images_summary(
     bucket = dao.NAME_MAP[cb_data]["bucket"]
     collection = dao.NAME_MAP[cb_data]["collection"]
 
-    documents = dao.get_cb_field_values(triplets, fields, bucket, collection, 5000)
+    documents = await adao.get_cb_field_values(
+        triplets, fields, bucket, collection, 5000
+    )
 
     processid_to_taxon_map = {}
     index_to_processid_map = {}
@@ -236,6 +257,45 @@ async def generate_images_summary(
 
         index_to_processid_map = {None: processids}
 
+    return await _summarize_processid_images(
+        processid_to_taxon_map, index_to_processid_map, max_images, caos_client
+    )
+
+
+async def summarize_record_images(records, max_images=-1, caos_client=None):
+    """
+    Select image metadata for the documents of a record, without querying its processid
+
+    - **records**: Documents of the record, as from `/api/documents/{query_id}`
+    - **max_images**: Maximum number of images returned, set to `IMG_LIMIT` if max_images < 0
+    - **caos_client**: Shared CAOS client, taken from the registry if not given
+    """
+    if max_images < 0:
+        max_images = _IMG_LIMIT
+
+    processid_to_taxon_map = {
+        record["processid"]: record["identification"] for record in records
+    }
+
+    return await _summarize_processid_images(
+        processid_to_taxon_map,
+        {None: sorted(processid_to_taxon_map)},
+        max_images,
+        caos_client,
+    )
+
+
+async def _summarize_processid_images(
+    processid_to_taxon_map, index_to_processid_map, max_images, caos_client=None
+):
+    """
+    Retrieve image metadata of sampled processids from CAOS and select up to max_images
+
+    - **processid_to_taxon_map**: Identification of each processid
+    - **index_to_processid_map**: Sampled processids by index (subtaxon, or None)
+    - **max_images**: Maximum number of images returned
+    - **caos_client**: Shared CAOS client, taken from the registry if not given
+    """
     processid_to_index_map = {}
     for index, processids in index_to_processid_map.items():
         for processid in processids:
@@ -250,14 +310,16 @@ async def generate_images_summary(
         return {"images": {}, "photographers": {}}
 
     # TODO: Validate behaviour on exception
+    if caos_client is None:
+        caos_client = http_clients.get_caos_client()
+
     try:
-        async with httpx.AsyncClient(timeout=None) as client:
-            resp = await client.get(
-                url=f"{util.get_caos_url()}/api/images",
-                params={"processids": ",".join(processids)},
-            )
-            resp.raise_for_status()
-            metadata = resp.json()
+        resp = await caos_client.get(
+            url="/api/images",
+            params={"processids": ",".join(processids)},
+        )
+        resp.raise_for_status()
+        metadata = resp.json()
 
     except httpx.HTTPStatusError:
         raise
@@ -5,7 +5,6 @@ from starlette.background import BackgroundTask
 from ast import literal_eval as make_tuple
 
 import base64
-import httpx
 import os
 import pathlib
 import subprocess
@@ -14,9 +13,13 @@ import tempfile
 
 try:
     import util
+    from services.ancillary import get_ancillary_documents
+    from services.summary import summarize_query
 except ImportError:
     sys.path.append(pathlib.Path(__file__).parent.parent.resolve().as_posix())
     import util
+    from services.ancillary import get_ancillary_documents
+    from services.summary import summarize_query
 
 route = APIRouter(tags=["maps"])
 
@@ -70,35 +73,13 @@ async def generate_map(
                     ),
                 )
 
-    try:
-        async with httpx.AsyncClient(timeout=None) as client:
-            params = {"query": ";".join(triplets[:-1]), "fields": "coord"}
-            resp = await client.get(
-                url=f"{util.get_app_url()}/api/summary", params=params
-            )
-            resp.raise_for_status()
-            stats = resp.json()
-
-            document = {}
-            if countryIso:
-                params = {
-                    "collection": "countries",
-                    "key": "iso_alpha_2",
-                    "values": countryIso,
-                }
-                resp = await client.get(
-                    url=f"{util.get_app_url()}/api/ancillary", params=params
-                )
-                resp.raise_for_status()
-                datasets = resp.json()
-                if datasets:
-                    document = datasets[0]
-
-    except httpx.HTTPStatusError:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Map failed to generate, please try again",
-        )
+    stats = await summarize_query(";".join(triplets[:-1]), "coord")
+
+    document = {}
+    if countryIso:
+        datasets = await get_ancillary_documents("countries", "iso_alpha_2", countryIso)
+        if datasets:
+            document = datasets[0]
 
     coordinates = stats.get("coord", {})
     coordinates_input = "\n".join(
@@ -5,10 +5,12 @@ import pathlib
 import sys
 
 try:
+    import adao
     import dao
     import util
 except ImportError:
     sys.path.append(pathlib.Path(__file__).parent.parent.resolve().as_posix())
+    import adao
     import dao
     import util
 
@@ -37,6 +39,16 @@ async def query_records(
     - **query**: A semicolon delimited set of "triplet" tokens. The format for each triplet is [scope]:[subscope]:[value]
     - **extent**: Set the number of document IDs to fetch (zero = 0 (query not run), full = all, others mappings found in `EXTENT_MAP`)
     """
+    return await run_query(query, extent)
+
+
+async def run_query(query, extent="limited"):
+    """
+    Run a triplets query and cache its document IDs, as served by `/api/query`
+
+    - **query**: A semicolon delimited set of "triplet" tokens
+    - **extent**: Document extent (zero, limited, large or full)
+    """
     triplets = util.sanitize_triplets_from_query(query, extent)
     query_id = util.generate_query_id_from_triplets(triplets)
 
@@ -44,8 +56,8 @@ async def query_records(
     bucket = dao.NAME_MAP[cb_data]["bucket"]
     collection = dao.NAME_MAP[cb_data]["collection"]
 
-    if not util.get_cache_from_query_id(query_id):
-        meta_ids = dao.get_cb_meta_ids(triplets, bucket, collection)
+    if util.get_cache_count_from_query_id(query_id) is None:
+        meta_ids = await adao.get_cb_meta_ids(triplets, bucket, collection)
         util.write_cache_with_query_id(query_id, meta_ids)
 
     if extent == "full":
@@ -2,9 +2,11 @@ from fastapi import APIRouter
 from pydantic import BaseModel
 from typing import List
 
+import functools
 import pyparsing as pr
 
 _UNKNOWN = "na"  # for unknown scope or rank of the query triplet <scope>:<rank>:<value>
+_PARSE_CACHE_SIZE = 4096  # Parsed queries memoised per worker
 
 route = APIRouter(tags=["query"])
 
@@ -54,8 +56,14 @@ def gen_query_parser():
     return query_pattern
 
 
+# The grammar is built once and parsed with packrat memoisation, as the alternatives of
+# query_pattern re-try the same words at each position
+pr.ParserElement.enable_packrat()
+_QUERY_PARSER = gen_query_parser()
+
+
 def parse_query(query_str):
-    parser = gen_query_parser()
+    parser = _QUERY_PARSER
 
     # Parse
     query_obj = {}
@@ -111,7 +119,22 @@ async def query_terms_parsing(query: str):
                  Double quote (") must be used to specify multi-word search term. Single quote can be used as part of a word/phrase.
                  Example) `Ontario "Homo sapiens" [tax]` will be parsed into `tax:na:Homo sapiens;na:na:Ontario`
     """
+    return parse_terms(query)
+
+
+def parse_terms(query):
+    """
+    Parse a free text query string into triplets, as served by `/api/query/parse`
+
+    - **query**: String where multiple search terms are separated by space with the optional scope specified as *[scope]* after a term
+    """
     cleansed_query = preprocess_input(query)
+    terms, ignored_terms = _parse_cleansed_query(cleansed_query)
+    return {"terms": terms, "ignored_terms": list(ignored_terms)}
+
+
+@functools.lru_cache(maxsize=_PARSE_CACHE_SIZE)
+def _parse_cleansed_query(cleansed_query):
     parsed_query, errors = parse_query(cleansed_query)
     response = postprocess_response(parsed_query, errors)
-    return response
+    return response["terms"], tuple(response["ignored_terms"])
@@ -57,14 +57,35 @@ def resolve_query(query: str = Query(min_length=3, max_length=250)):
                  [scope]:[subscope]:[value], but can also accept "doublet" ([scope]:[value]) and
                  "singleton" ([value]) tokens.
     """
+    processed_query = preprocess_query(query)
+
+    if processed_query["failed_terms"] or not processed_query["successful_terms"]:
+        return JSONResponse(
+            content=processed_query,
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    else:
+        return {"successful_terms": processed_query["successful_terms"]}
+
+
+def preprocess_query(query):
+    """
+    Resolve query tokens into triplets, as served by `/api/query/preprocessor`. The query
+    failed to resolve if any `failed_terms` are returned or no `successful_terms` are
+
+    - **query**: A semicolon delimited set of "triplet", "doublet" or "singleton" tokens
+    """
     tokens = [item.strip() for item in query.split(";") if item.strip()]
 
+    # All terms of the query are resolved together in one batch
+    resolved_terms = dao.resolve_terms([token.split(":", 2)[-1] for token in tokens])
+
     successful_terms = []
     failed_terms = []
     for token in tokens:
         term = token.split(":", 2)[-1]
 
-        resolved_triplets = dao.resolve_term(term)
+        resolved_triplets = resolved_terms[term]
         if not resolved_triplets:
             # TODO: If token came with scope/subscope, confirm that we ignore them?
             partial_triplet = util.generate_partial_triplet(term)
@@ -94,13 +115,4 @@ def resolve_query(query: str = Query(min_length=3, max_length=250)):
                     {"submitted": triplet, "matched": ";".join(resolved_triplets)}
                 )
 
-    if failed_terms or not successful_terms:
-        return JSONResponse(
-            content={
-                "successful_terms": successful_terms,
-                "failed_terms": failed_terms,
-            },
-            status_code=status.HTTP_400_BAD_REQUEST,
-        )
-    else:
-        return {"successful_terms": successful_terms}
+    return {"successful_terms": successful_terms, "failed_terms": failed_terms}
@@ -0,0 +1,187 @@
+from fastapi import APIRouter, Query, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from typing import Any, Dict, List
+
+import asyncio
+import logging
+import pathlib
+import sys
+import ujson
+
+try:
+    import util
+    from services.images import summarize_images
+    from services.query import run_query
+    from services.query_parse import parse_terms
+    from services.query_preprocessor import TermMatch, preprocess_query
+    from services.summary import summarize_query
+    from settings import settings
+except ImportError:
+    sys.path.append(pathlib.Path(__file__).parent.parent.resolve().as_posix())
+    import util
+    from services.images import summarize_images
+    from services.query import run_query
+    from services.query_parse import parse_terms
+    from services.query_preprocessor import TermMatch, preprocess_query
+    from services.summary import summarize_query
+    from settings import settings
+
+exc_logger = logging.getLogger("exc_logger")
+
+route = APIRouter(tags=["query"])
+
+
+class SearchResponse(BaseModel):
+    terms: str
+    ignored_terms: List[str]
+    successful_terms: List[TermMatch]
+    query_id: str
+    extent_limit: int | None
+    triplets: List[str]
+    summary: Dict[str, Any]
+    stats: Dict[str, int]
+    images: Dict[str, Any] | None
+    image_count: int | None
+
+
+class SearchFail(BaseModel):
+    terms: str
+    ignored_terms: List[str]
+    successful_terms: List[TermMatch]
+    failed_terms: List[TermMatch]
+
+
+_SEARCH_FIELDS = [
+    "specimens",
+    "marker_code",
+    "bin_uri",
+    "species",
+    "country/ocean",
+    "inst",
+    "sequence_run_site",
+    "identified_by",
+]
+
+
+@route.get(
+    "/search",
+    responses={
+        200: {"model": SearchResponse, "description": "Search Results"},
+        400: {"model": SearchFail, "description": "Failed Query Preprocessing"},
+    },
+)
+async def search_records(
+    query: str = Query(min_length=3, max_length=250),
+    extent: str = Query(
+        default="limited", title="Document extent", regex="(zero|limited|large|full)"
+    ),
+):
+    """
+    Run a free text search in one call, as done by the search results page. The query is parsed
+    and resolved into triplets (as `/api/query/parse` and `/api/query/preprocessor`), then its
+    summary, document IDs (as `/api/summary` and `/api/query`) and images are retrieved
+    concurrently. Results are cached by the resolved triplets. If any term cannot be resolved
+    unambiguously, will return the possible values as an error.
+
+    - **query**: String where multiple search terms are separated by space with the optional scope specified as *[scope]* after a term
+    - **extent**: Set the number of document IDs to fetch (zero = 0 (query not run), full = all, others mappings found in `EXTENT_MAP`)
+    """
+    search = await run_search(query, extent)
+
+    if "failed_terms" in search:
+        return JSONResponse(content=search, status_code=status.HTTP_400_BAD_REQUEST)
+    else:
+        return search
+
+
+def _generate_search_stats(summary):
+    counts = summary.get("counts", {})
+
+    return {
+        "specimens": counts.get("specimens", 0),
+        "sequences": sum(summary.get("marker_code", {}).values()),
+        "records_w_bins": sum(summary.get("bin_uri", {}).values()),
+        "records_w_species": sum(summary.get("species", {}).values()),
+        "bins": len(summary.get("bin_uri", {})),
+        "species": len(summary.get("species", {})),
+        "countries/oceans": len(summary.get("country/ocean", {})),
+        "institutions": len(summary.get("inst", {})),
+    }
+
+
+async def _summarize_search_images(query_id):
+    # Images are optional, so a search is returned without them if CAOS is slow
+    try:
+        return await asyncio.wait_for(
+            summarize_images(query_id), settings.view_optional_timeout
+        )
+    except Exception as exc:
+        exc_logger.warning(f"Search images unavailable: {exc!r}")
+        return None
+
+
+async def _run_resolved_search(resolved_query, extent):
+    triplets = util.sanitize_triplets_from_query(resolved_query, extent)
+    query_id = util.generate_query_id_from_triplets(triplets)
+    meta_id = util.generate_search_meta_id(query_id)
+
+    if cached := util.get_cache_from_meta_ids([meta_id])[0]:
+        return ujson.loads(cached)
+
+    # The query ID only depends on the triplets, so images do not wait for the query
+    summary, query_resp, images = await asyncio.gather(
+        summarize_query(resolved_query, ",".join(_SEARCH_FIELDS)),
+        run_query(resolved_query, extent),
+        _summarize_search_images(query_id),
+    )
+
+    image_count = None
+    if images is not None:
+        image_count = sum(len(object_list) for object_list in images["images"].values())
+
+    search = {
+        "query_id": query_resp["query_id"],
+        "extent_limit": query_resp["extent_limit"],
+        "triplets": triplets,
+        "summary": summary,
+        "stats": _generate_search_stats(summary),
+        "images": images,
+        "image_count": image_count,
+    }
+
+    # Searches missing their images are left for the next request to complete
+    if images is not None:
+        util.write_cache_with_meta_ids({meta_id: ujson.dumps(search, default=str)})
+
+    return search
+
+
+async def run_search(query, extent="limited"):
+    """
+    Parse, resolve and run a free text search, as served by `/api/search`. The search
+    failed to resolve if any `failed_terms` are returned
+
+    - **query**: String where multiple search terms are separated by space with the optional scope specified as *[scope]* after a term
+    - **extent**: Document extent (zero, limited, large or full)
+    """
+    parsed_query = parse_terms(query)
+    search = {
+        "terms": parsed_query["terms"],
+        "ignored_terms": parsed_query["ignored_terms"],
+    }
+
+    processed_query = await run_in_threadpool(preprocess_query, parsed_query["terms"])
+    search["successful_terms"] = processed_query["successful_terms"]
+
+    if processed_query["failed_terms"] or not processed_query["successful_terms"]:
+        search["failed_terms"] = processed_query["failed_terms"]
+        return search
+
+    resolved_query = ";".join(
+        term["matched"] for term in processed_query["successful_terms"]
+    )
+    search.update(await _run_resolved_search(resolved_query, extent))
+
+    return search
@@ -7,10 +7,12 @@ import sys
 import ujson
 
 try:
+    import adao
     import dao
     import util
 except ImportError:
     sys.path.append(pathlib.Path(__file__).parent.parent.resolve().as_posix())
+    import adao
     import dao
     import util
 
@@ -29,12 +31,12 @@ async def retrieve_general_stats(stat: str = Query(title="Stat to retrieve")):
     general_stats = util.get_cache_from_meta_ids([util.STATS_META_ID])[0]
     if general_stats is None:
         general_stats = {
-            "total seqs": dao.get_total_seqs_stat(),
-            "total bins": dao.get_total_bins_stat(),
-            "animal species": dao.get_animal_species_stat(),
-            "plant species": dao.get_plant_species_stat(),
-            "fungi species": dao.get_fungi_species_stat(),
-            "other species": dao.get_other_species_stat(),
+            "total seqs": await adao.get_total_seqs_stat(),
+            "total bins": await adao.get_total_bins_stat(),
+            "animal species": await adao.get_animal_species_stat(),
+            "plant species": await adao.get_plant_species_stat(),
+            "fungi species": await adao.get_fungi_species_stat(),
+            "other species": await adao.get_other_species_stat(),
         }
 
         docs_to_cache = {util.STATS_META_ID: ujson.dumps(general_stats)}
@@ -1,16 +1,19 @@
 from fastapi import APIRouter, Query
 from typing import Dict, Any
 
+import asyncio
 import pathlib
 import sys
 import ujson
 from collections import defaultdict
 
 try:
+    import adao
     import dao
     import util
 except ImportError:
     sys.path.append(pathlib.Path(__file__).parent.parent.resolve().as_posix())
+    import adao
     import dao
     import util
 
@@ -94,6 +97,18 @@ async def generate_metadata_summary(
     - **reduce**: Field(s) to perform an additional reduction on, as CSV
     - **reduce_operation**: Type of reduce, only available option is `count` (sum of all values in aggregates, excluding `counts`)
     """
+    return await summarize_query(query, fields, reduce, reduce_operation)
+
+
+async def summarize_query(query, fields, reduce="", reduce_operation="count"):
+    """
+    Aggregate fields of the documents selected by a query, as served by `/api/summary`
+
+    - **query**: A semicolon delimited set of "triplet" tokens
+    - **fields**: Field(s) to extract and aggregate, as CSV
+    - **reduce**: Field(s) to perform an additional reduction on, as CSV
+    - **reduce_operation**: Type of reduce, only available option is `count`
+    """
     triplets = util.sanitize_triplets_from_query(
         query, "full"
     )  # For consistency in cache access
@@ -146,7 +161,9 @@ async def generate_metadata_summary(
                     if _ALLOWED_FIELDS_MAP["Aggregates|summary"].get(field)
                 ]
             )
-            documents = dao.get_cb_field_values(triplets, field_set, bucket, collection)
+            documents = await adao.get_cb_field_values(
+                triplets, field_set, bucket, collection
+            )
             stats = util.reduce_summary_aggregates(documents)
 
         # Special cases for 'counts-only'
@@ -170,8 +187,18 @@ async def generate_metadata_summary(
                 if _ALLOWED_FIELDS_MAP["BCDM|primary_data"].get(field)
             ]
         )
-        documents = dao.get_cb_group_by_field_documents(
-            triplets, field_set, bucket, collection
+
+        # 'Counts-only' fields only need a total, so they are not grouped by value
+        documents, distinct_counts = await asyncio.gather(
+            adao.get_cb_group_by_field_documents(
+                triplets,
+                field_set.difference(_COUNTS_ONLY),
+                bucket,
+                collection,
+            ),
+            adao.get_cb_distinct_counts(
+                triplets, field_set.intersection(_COUNTS_ONLY), bucket, collection
+            ),
         )
 
         stats = defaultdict(lambda: {})
@@ -183,23 +210,21 @@ async def generate_metadata_summary(
                     val = str(tuple(val))
 
                 if row["field"] in _SPECIMEN_CENTRIC:
-                    count = len(set(row["processids"]))
+                    count = row["specimens"]
                 else:
-                    count = len(row["processids"])
+                    count = row["records"]
                 stats[row["field"]][val] = count
 
         # Special cases for 'counts-only'
-        counts = {}
-        for field in stats:
-            if field in _COUNTS_ONLY:
-                counts[_COUNTS_ONLY[field]] = sum(stats[field].values())
+        counts = {
+            _COUNTS_ONLY[field]: count
+            for field, count in distinct_counts.items()
+            if field in _COUNTS_ONLY and count
+        }
 
         if counts:
             stats["counts"] = counts
 
-        for field in _COUNTS_ONLY:
-            stats.pop(field, None)
-
     reduce = [field.strip() for field in reduce.split(",")]
     for field in stats:
         if field in reduce and field != "counts":
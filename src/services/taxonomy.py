@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Path, Query, HTTPException, status, Request
+from fastapi import APIRouter, Depends, Path, Query, HTTPException, status, Request
 from pydantic import BaseModel, Field
 from typing import List
 
@@ -12,11 +12,15 @@ import urllib.parse
 from collections import defaultdict
 
 try:
+    import adao
     import dao
+    import http_clients
     import util
 except ImportError:
     sys.path.append(pathlib.Path(__file__).parent.parent.resolve().as_posix())
+    import adao
     import dao
+    import http_clients
     import util
 
 route = APIRouter(tags=["taxonomy"])
@@ -110,6 +114,7 @@ async def retrieve_taxonomy_description(
     request: Request,
     name: str = Query(title="Taxonomy Name"),
     rank: str = Query(title="Taxonomy Rank"),
+    wikipedia_client: httpx.AsyncClient = Depends(http_clients.get_wikipedia_client),
 ):
     """
     Retrieve a taxonomy description from BOLD as a proxy endpoint.
@@ -133,20 +138,19 @@ async def retrieve_taxonomy_description(
     # If nothing found in manual, search Wikipedia
     if not wiki_text:
         search_text = urllib.parse.quote(name)  # URL encoding
-        wiki_url = f"https://en.wikipedia.org/w/api.php?action=query&format=json&prop=extracts&titles={search_text}&redirects=1&exintro=1&explaintext=1"
+        wiki_url = f"/w/api.php?action=query&format=json&prop=extracts&titles={search_text}&redirects=1&exintro=1&explaintext=1"
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(wiki_url)
-                wiki_response = response.json()
-                pages = wiki_response["query"]["pages"]
-                first_page = next(iter(pages.values()))
-
-                if first_page["pageid"] == -1:
-                    wiki_text = "No Wikipedia page found for this term."
-                else:
-                    wiki_text = first_page.get("extract", "")
-                    wiki_text = re.sub(r"\s*\(\s*\)\s*", " ", wiki_text).strip()
+            response = await wikipedia_client.get(wiki_url)
+            wiki_response = response.json()
+            pages = wiki_response["query"]["pages"]
+            first_page = next(iter(pages.values()))
+
+            if first_page["pageid"] == -1:
+                wiki_text = "No Wikipedia page found for this term."
+            else:
+                wiki_text = first_page.get("extract", "")
+                wiki_text = re.sub(r"\s*\(\s*\)\s*", " ", wiki_text).strip()
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -178,7 +182,7 @@ async def retrieve_taxonomy_hierarchy(
     """
     tax_doc = {rank.replace("`", ""): [] for rank in _TAX_RANKS}
 
-    tax_data = dao.get_cb_taxonomy_summaries_by_name_and_rank(name, rank)
+    tax_data = await adao.get_cb_taxonomy_summaries_by_name_and_rank(name, rank)
     if tax_data:
         tax_summary = tax_data[0]
         tax_doc[rank].append(tax_summary)
@@ -186,7 +190,7 @@ async def retrieve_taxonomy_hierarchy(
         taxid = tax_summary["taxid"]
         parent_taxid = tax_summary["parent_taxid"]
 
-        parent_tax_data = dao.get_cb_taxonomy_summaries_by_taxids([taxid])
+        parent_tax_data = await adao.get_cb_taxonomy_summaries_by_taxids([taxid])
         # Loop up the hierarchy and fill information
         while parent_tax_data:
             tax_summary = parent_tax_data[0]
@@ -194,10 +198,12 @@ async def retrieve_taxonomy_hierarchy(
             tax_doc[rank].append(tax_summary)
 
             parent_taxid = tax_summary["parent_taxid"]
-            parent_tax_data = dao.get_cb_taxonomy_summaries_by_taxids([parent_taxid])
+            parent_tax_data = await adao.get_cb_taxonomy_summaries_by_taxids(
+                [parent_taxid]
+            )
 
         # Retrieve immediate child summaries in hierarchy
-        child_tax_data = dao.get_cb_taxonomy_summaries_by_parent_taxids([taxid])
+        child_tax_data = await adao.get_cb_taxonomy_summaries_by_parent_taxids([taxid])
         for child_tax_summary in child_tax_data:
             rank = child_tax_summary["rank_name"]
             tax_doc[rank].append(child_tax_summary)
@@ -227,13 +233,13 @@ async def generate_taxonomy_summary(
     bucket = dao.NAME_MAP[cb_data]["bucket"]
     collection = dao.NAME_MAP[cb_data]["collection"]
 
-    documents = dao.get_cb_group_by_field_documents(
+    documents = await adao.get_cb_group_by_field_documents(
         triplets, fields, bucket, collection
     )
     stats = defaultdict(lambda: {})
     for row in documents:
         if val := row.get("val"):
-            count = len(set(row["processids"]))
+            count = row["specimens"]
             stats[row["field"].replace("`", "")][val] = count
 
     taxonomy = {}
@@ -307,11 +313,11 @@ async def generate_taxonomy_map_summary(
             bucket = dao.NAME_MAP[cb_data]["bucket"]
             collection = dao.NAME_MAP[cb_data]["collection"]
 
-            documents = dao.get_cb_field_values(
+            documents = await adao.get_cb_field_values(
                 triplets, fields + ["counts.specimens"], bucket, collection
             )
     else:
-        documents = dao.get_cb_taxonomy_paths(triplets)
+        documents = await adao.get_cb_taxonomy_paths(triplets)
 
     # 1. Assessment block
     # Detect name duplicates for collision
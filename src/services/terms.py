@@ -7,11 +7,15 @@ from starlette import status
 from starlette.responses import JSONResponse
 
 try:
+    import adao
     import dao
+    import term_index
     import util
 except ImportError:
     sys.path.append(pathlib.Path(__file__).parent.parent.resolve().as_posix())
+    import adao
     import dao
+    import term_index
     import util
 
 route = APIRouter(tags=["terms"])
@@ -20,7 +24,9 @@ route = APIRouter(tags=["terms"])
 @route.get("/terms", response_description="Matching list of terms")
 async def fetch_term_hits(
     partial_term: str = Query(title="Partial term"),
-    limit: int = Query(20, title="Limit # of hits to return"),
+    limit: int = Query(
+        20, title="Limit # of hits to return", le=term_index._TERM_INDEX_TOP_K
+    ),
 ):
     """
     Return top X terms that match the supplied partial term at the start of the term.
@@ -28,6 +34,7 @@ async def fetch_term_hits(
     creating matches easily with proxy characters.
 
     - **partial_term**: Start of term to search for
+    - **limit**: Number of hits to return (maximum 100)
     """
     scope = None
     if ":" in partial_term:
@@ -49,6 +56,9 @@ async def fetch_term_hits(
             status_code=status.HTTP_400_BAD_REQUEST,
         )
 
-    hits = dao.query_term_hits(sanitized_partial_term, scope, limit)
+    # Served from the in-memory term index, or accepted_terms until it is loaded
+    hits = term_index.get_term_hits(sanitized_partial_term, scope, limit)
+    if hits is None:
+        hits = await adao.query_term_hits(sanitized_partial_term, scope, limit)
 
     return hits
@@ -22,18 +22,39 @@ class Settings(BaseSettings):
 
     offline_path: str = "/tmp/bold-public-portal"
     cache_path: str = "/tmp/bold-public-portal/cache"
+    cache_max_bytes: int = 10 * 1024**3
+    cache_max_entries: int = 100000
+    cache_ttl: int = 604800  # 7 days
+    cache_sweep_interval: int = 300
+    terms_index_path: str = "/tmp/bold-public-portal/terms"
+    terms_index_refresh: int = 60  # Seconds between data release checks
 
     redis_host: str = "redis"
     redis_port: int = 6379
     redis_db: int = 0
+    redis_codec: str = "zlib"  # zlib, zstd or none
+    redis_codec_level: int = 1
 
     couchbase_endpoint: str = "couchbase://couchbase"
     couchbase_user: str = ""
     couchbase_password: str = ""
     couchbase_timeout: int = 7200
+    couchbase_prepared_statements: bool = True
+
+    view_timeout: float = 300  # Seconds to wait for data a page requires
+    view_optional_timeout: float = 10  # Seconds to wait for data a page can omit
+    page_cache_ttl: int = 86400  # Seconds a rendered page is served as is, 0 disables
+    page_cache_stale: int = 604800  # Seconds a page is then served while re-rendered
+    download_prefetch_depth: int = 2  # Batches fetched ahead of the one sent
+    download_codec_level: int = 1  # gzip (1-9) or zstd (1-22) compression level
 
     app_url: str = "http://fastapi-app:8000"
     caos_url: str = "https://caos.boldsystems.org"
+    caos_timeout: float = 60
+    wikipedia_timeout: float = 10
+    http_connect_timeout: float = 5
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
 
 
 settings = Settings()
@@ -0,0 +1,333 @@
+import asyncio
+import fcntl
+import logging
+import mmap
+import os
+import pathlib
+import struct
+import time
+import ujson
+
+import numpy as np
+
+import dao
+import util
+from settings import settings
+
+exc_logger = logging.getLogger("exc_logger")
+query_logger = logging.getLogger("query_logger")
+
+# Accepted terms sorted by standardized term in a memory-mapped file, shared by the
+# workers through the page cache. A prefix matches a contiguous range of terms, so
+# autocomplete is a binary search plus a top-k by records over that range. Ranges too
+# large to rank per request have their top-k per scope precomputed at build time. The
+# file is built once per data release and reloaded when a release is published
+_TERM_INDEX = {"version": None, "index": None}
+
+_TERM_INDEX_MAGIC = b"BTI1"
+_TERM_INDEX_HEADER = struct.Struct("=4sIQQQQQII")
+_TERM_INDEX_MIN_PREFIX = 3  # Shortest partial term accepted by /api/terms
+_TERM_INDEX_SCAN_LIMIT = 4096  # Largest range ranked per request
+_TERM_INDEX_TOP_K = 100  # Hits precomputed per prefix and scope for larger ranges
+
+###
+# Build
+###
+
+
+def _get_term_index_file(version):
+    name = f"terms-{version}.bin" if version else "terms.bin"
+    return pathlib.Path(settings.terms_index_path, name)
+
+
+def _get_prefix_nodes(keys):
+    # Prefixes of at least _TERM_INDEX_MIN_PREFIX characters matching more terms than
+    # are ranked per request, refining only the ranges that are still too large
+    nodes = []
+    ranges = [(0, len(keys), _TERM_INDEX_MIN_PREFIX)]
+    while ranges:
+        start, stop, length = ranges.pop()
+
+        i = start
+        while i < stop:
+            prefix = keys[i][:length]
+            j = i + 1
+            while j < stop and keys[j][:length] == prefix:
+                j += 1
+
+            if len(prefix) == length and j - i > _TERM_INDEX_SCAN_LIMIT:
+                nodes.append((prefix.encode(), i, j))
+                ranges.append((i, j, length + 1))
+            i = j
+
+    nodes.sort()
+    return nodes
+
+
+def _rank_terms(records, start, stop):
+    # Positions ordered as the terms query: records descending, then term ascending
+    return start + np.lexsort((np.arange(stop - start), -records[start:stop]))
+
+
+def _encode_term_index(terms):
+    terms = sorted(terms, key=lambda term: term.get("standardized_term") or "")
+    keys = [term.get("standardized_term") or "" for term in terms]
+
+    scopes = sorted({term.get("scope") or "" for term in terms})
+    scope_codes = {scope: code for code, scope in enumerate(scopes)}
+    term_scopes = np.array(
+        [scope_codes[term.get("scope") or ""] for term in terms], dtype=np.uint8
+    )
+    records = np.array([term.get("records") or 0 for term in terms], dtype=np.int64)
+
+    encoded_keys = [key.encode() for key in keys]
+    encoded_docs = [ujson.dumps(term).encode() for term in terms]
+    key_offsets = np.cumsum([0, *map(len, encoded_keys)], dtype=np.uint64)
+    doc_offsets = np.cumsum([0, *map(len, encoded_docs)], dtype=np.uint64)
+
+    nodes = _get_prefix_nodes(keys)
+    node_keys = [prefix for prefix, _, _ in nodes]
+    node_key_offsets = np.cumsum([0, *map(len, node_keys)], dtype=np.uint64)
+    node_top = np.full(
+        (len(nodes), len(scopes) + 1, _TERM_INDEX_TOP_K), -1, dtype=np.int32
+    )
+    for node, (_, start, stop) in enumerate(nodes):
+        ranked = _rank_terms(records, start, stop)
+        top = ranked[:_TERM_INDEX_TOP_K]
+        node_top[node, 0, : len(top)] = top
+        for code in range(len(scopes)):
+            top = ranked[term_scopes[ranked] == code][:_TERM_INDEX_TOP_K]
+            node_top[node, code + 1, : len(top)] = top
+
+    header = _TERM_INDEX_HEADER.pack(
+        _TERM_INDEX_MAGIC,
+        _TERM_INDEX_TOP_K,
+        len(terms),
+        len(nodes),
+        int(key_offsets[-1]),
+        int(doc_offsets[-1]),
+        int(node_key_offsets[-1]),
+        len(scopes),
+        len("\n".join(scopes).encode()),
+    )
+
+    return [
+        header,
+        key_offsets.tobytes(),
+        doc_offsets.tobytes(),
+        records.tobytes(),
+        node_key_offsets.tobytes(),
+        node_top.tobytes(),
+        term_scopes.tobytes(),
+        "\n".join(scopes).encode(),
+        *encoded_keys,
+        *encoded_docs,
+        *node_keys,
+    ]
+
+
+def _build_term_index(index_file):
+    # One worker builds the file for a release, the others load it on a later refresh
+    os.makedirs(settings.terms_index_path, exist_ok=True)
+    with open(f"{index_file}.lock", "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+
+        if not index_file.exists():
+            start_time = time.perf_counter()
+            terms = dao.get_cb_accepted_terms()
+
+            tmp_file = index_file.with_suffix(".tmp")
+            with open(tmp_file, "wb") as fp:
+                fp.writelines(_encode_term_index(terms))
+            os.replace(tmp_file, index_file)
+
+            query_logger.info(
+                f"Term index built - {index_file} {len(terms)} terms {time.perf_counter() - start_time}"
+            )
+
+    return True
+
+
+###
+# Load
+###
+
+
+def _load_term_index(index_file):
+    with open(index_file, "rb") as fp:
+        buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    (
+        magic,
+        top_k,
+        count,
+        node_count,
+        keys_size,
+        docs_size,
+        node_keys_size,
+        scope_count,
+        scopes_size,
+    ) = _TERM_INDEX_HEADER.unpack_from(buffer)
+    if magic != _TERM_INDEX_MAGIC:
+        raise ValueError(f"Unrecognised term index {index_file}")
+
+    # Views into the mapping, which stays open for as long as any of them is referenced
+    sections = {}
+    position = _TERM_INDEX_HEADER.size
+    for name, dtype, size in [
+        ("key_offsets", np.uint64, count + 1),
+        ("doc_offsets", np.uint64, count + 1),
+        ("records", np.int64, count),
+        ("node_key_offsets", np.uint64, node_count + 1),
+        ("node_top", np.int32, node_count * (scope_count + 1) * top_k),
+        ("scopes", np.uint8, count),
+        ("scope_names", np.uint8, scopes_size),
+        ("keys", np.uint8, keys_size),
+        ("docs", np.uint8, docs_size),
+        ("node_keys", np.uint8, node_keys_size),
+    ]:
+        sections[name] = np.frombuffer(buffer, dtype=dtype, count=size, offset=position)
+        position += sections[name].nbytes
+
+    scope_names = sections.pop("scope_names").tobytes().decode().split("\n")
+
+    return {
+        **sections,
+        "count": count,
+        "node_count": node_count,
+        "node_top": sections["node_top"].reshape(node_count, scope_count + 1, top_k),
+        "scope_codes": {scope: code for code, scope in enumerate(scope_names)},
+        "size": len(buffer),
+    }
+
+
+###
+# Lookup
+###
+
+
+def _get_bytes(blob, offsets, i):
+    return blob[int(offsets[i]) : int(offsets[i + 1])].tobytes()
+
+
+def _bisect_terms(index, prefix, upper):
+    # First term from which keys are >= prefix, or > prefix when upper (prefix range end)
+    lo, hi = 0, index["count"]
+    while lo < hi:
+        mid = (lo + hi) // 2
+        key = _get_bytes(index["keys"], index["key_offsets"], mid)
+        if upper:
+            key = key[: len(prefix)]
+
+        if key < prefix or (upper and key == prefix):
+            lo = mid + 1
+        else:
+            hi = mid
+
+    return lo
+
+
+def _find_node(index, prefix):
+    lo, hi = 0, index["node_count"]
+    while lo < hi:
+        mid = (lo + hi) // 2
+        key = _get_bytes(index["node_keys"], index["node_key_offsets"], mid)
+
+        if key == prefix:
+            return mid
+        elif key < prefix:
+            lo = mid + 1
+        else:
+            hi = mid
+
+    return None
+
+
+def get_term_hits(partial_term, scope=None, limit=20):
+    # None until the index is loaded, callers then fall back to querying accepted_terms
+    if (index := _TERM_INDEX["index"]) is None:
+        return None
+
+    prefix = partial_term.encode()
+    start = _bisect_terms(index, prefix, False)
+    stop = _bisect_terms(index, prefix, True)
+
+    code = None
+    if scope is not None:
+        if (code := index["scope_codes"].get(scope)) is None:
+            return []
+
+    node = None
+    if stop - start > _TERM_INDEX_SCAN_LIMIT and limit <= index["node_top"].shape[2]:
+        node = _find_node(index, prefix)
+
+    if node is not None:
+        top = index["node_top"][node, 0 if code is None else code + 1]
+        hits = top[top >= 0][:limit]
+    else:
+        hits = _rank_terms(index["records"], start, stop)
+        if code is not None:
+            hits = hits[index["scopes"][hits] == code]
+        hits = hits[:limit]
+
+    return [
+        ujson.loads(_get_bytes(index["docs"], index["doc_offsets"], i)) for i in hits
+    ]
+
+
+def get_term_index_stats():
+    index = _TERM_INDEX["index"]
+
+    return {
+        "version": _TERM_INDEX["version"],
+        "loaded": index is not None,
+        "terms": index["count"] if index else None,
+        "nodes": index["node_count"] if index else None,
+        "bytes": index["size"] if index else None,
+    }
+
+
+###
+# Refresh
+###
+
+
+def refresh_term_index():
+    version = util.get_data_release_version()
+    if _TERM_INDEX["index"] is not None and _TERM_INDEX["version"] == version:
+        return
+
+    index_file = _get_term_index_file(version)
+    if not index_file.exists() and not _build_term_index(index_file):
+        return
+
+    # Swapped whole, requests holding the previous index finish with it
+    index = _load_term_index(index_file)
+    _TERM_INDEX.update(version=version, index=index)
+    query_logger.info(f"Term index loaded - {index_file} {index['count']} terms")
+
+    # Only files older than the loaded index are removed, as a worker still on a
+    # previous release must not remove the index of a newer one
+    loaded_time = index_file.stat().st_mtime
+    for stale_file in index_file.parent.glob("terms*.bin*"):
+        try:
+            if (
+                stale_file.name.split(".bin")[0] != index_file.stem
+                and stale_file.stat().st_mtime < loaded_time
+            ):
+                stale_file.unlink(missing_ok=True)
+        except FileNotFoundError:
+            pass
+
+
+async def run_term_index_loader():
+    while True:
+        try:
+            await asyncio.to_thread(refresh_term_index)
+        except Exception as exc:
+            exc_logger.warning(f"Term index refresh failed: {exc!r}")
+
+        await asyncio.sleep(settings.terms_index_refresh)
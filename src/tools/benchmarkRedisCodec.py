@@ -0,0 +1,127 @@
+import sys
+import pathlib
+import redis
+import time
+import ujson
+
+
+sys.path.append(pathlib.Path(__file__).parent.parent.resolve().as_posix())
+from settings import settings
+from util import (
+    _REDIS_CODEC_MIN_SIZE,
+    _REDIS_CODECS,
+    _REDIS_VALUE_POOL,
+    decode_cache_value,
+    encode_cache_value,
+)
+
+_BENCHMARK_KEY = "benchmark-redis-codec"
+
+
+def benchmark_redis_round_trip(encoded_values):
+    # Values are written, read back and measured one at a time, as the cache does
+    keys = [f"{_BENCHMARK_KEY}:{i}" for i in range(len(encoded_values))]
+    with redis.StrictRedis(connection_pool=_REDIS_VALUE_POOL) as redis_conn:
+        try:
+            start_time = time.perf_counter()
+            for key, value in zip(keys, encoded_values):
+                redis_conn.set(key, value)
+            set_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            for key in keys:
+                decode_cache_value(redis_conn.get(key))
+            get_time = time.perf_counter() - start_time
+
+            memory = sum(redis_conn.memory_usage(key, samples=0) or 0 for key in keys)
+        finally:
+            for i in range(0, len(keys), 1000):
+                redis_conn.unlink(*keys[i : i + 1000])
+
+    return {
+        "memory": memory,
+        "set_us": set_time / len(keys) * 1e6,
+        "get_us": get_time / len(keys) * 1e6,
+    }
+
+
+def benchmark_redis_codec(values, codec, level, round_trip=False):
+    settings.redis_codec_level = level
+
+    start_time = time.perf_counter()
+    encoded_values = [encode_cache_value(value, codec) for value in values]
+    encode_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for value in encoded_values:
+        decode_cache_value(value)
+    decode_time = time.perf_counter() - start_time
+
+    raw_size = sum(len(value.encode()) for value in values)
+    encoded_size = sum(len(value) for value in encoded_values)
+
+    return {
+        "codec": codec,
+        "level": level,
+        "size": encoded_size,
+        "ratio": encoded_size / raw_size if raw_size else 0,
+        "encode_us": encode_time / len(values) * 1e6,
+        "decode_us": decode_time / len(values) * 1e6,
+        **(benchmark_redis_round_trip(encoded_values) if round_trip else {}),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--input",
+        required=True,
+        help="Input JSONL file, one cached document per line",
+    )
+    parser.add_argument(
+        "-l",
+        "--levels",
+        default="1,3,6",
+        help="Comma separated compression levels to compare",
+    )
+    parser.add_argument(
+        "-r",
+        "--redis",
+        action="store_true",
+        help="Also measure Redis memory usage and SET/GET round trips (uses settings)",
+    )
+    args = parser.parse_args()
+
+    # Smaller values are stored uncompressed whatever the codec, so are left out
+    with open(args.input) as fp:
+        values = [ujson.dumps(ujson.loads(line), default=str) for line in fp]
+    skipped = len(values)
+    values = [value for value in values if len(value.encode()) >= _REDIS_CODEC_MIN_SIZE]
+    skipped -= len(values)
+
+    if not values:
+        sys.exit(f"No value of at least {_REDIS_CODEC_MIN_SIZE} bytes")
+
+    print(
+        f"{len(values)} value(s), {sum(len(v.encode()) for v in values)} bytes ({skipped} under {_REDIS_CODEC_MIN_SIZE} bytes skipped)"
+    )
+    print(
+        "codec\tlevel\tbytes\tratio\tencode_us\tdecode_us"
+        + ("\tmemory\tset_us\tget_us" if args.redis else "")
+    )
+
+    results = [benchmark_redis_codec(values, "none", 0, args.redis)]
+    for codec in _REDIS_CODECS:
+        for level in args.levels.split(","):
+            results.append(benchmark_redis_codec(values, codec, int(level), args.redis))
+
+    for result in results:
+        line = f"{result['codec']}\t{result['level']}\t{result['size']}\t{result['ratio']:.3f}\t{result['encode_us']:.1f}\t{result['decode_us']:.1f}"
+        if args.redis:
+            line += (
+                f"\t{result['memory']}\t{result['set_us']:.1f}\t{result['get_us']:.1f}"
+            )
+        print(line)
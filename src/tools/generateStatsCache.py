@@ -15,7 +15,7 @@ from dao import (
 from util import STATS_META_ID, write_cache_with_meta_ids
 
 
-def generate_stats_cache():
+def generate_stats_cache(data_release=None):
     general_stats = {
         "total seqs": get_total_seqs_stat(),
         "total bins": get_total_bins_stat(),
@@ -26,13 +26,18 @@ def generate_stats_cache():
     }
 
     docs_to_cache = {STATS_META_ID: ujson.dumps(general_stats)}
-    write_cache_with_meta_ids(docs_to_cache, None)
+    write_cache_with_meta_ids(docs_to_cache, None, data_release)
 
 
 if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-r",
+        "--data-release",
+        help="Data release version to write into (default: the published release)",
+    )
     args = parser.parse_args()
 
-    generate_stats_cache()
+    generate_stats_cache(args.data_release)
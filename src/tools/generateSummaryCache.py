@@ -14,7 +14,7 @@ from util import (
 )
 
 
-def generate_summary_cache(triplet_queries):
+def generate_summary_cache(triplet_queries, data_release=None):
     docs_to_cache = {}
     summary_docs = {}
 
@@ -50,7 +50,7 @@ def generate_summary_cache(triplet_queries):
         )
         docs_to_cache[query_id] = ujson.dumps(reduce_doc, default=str)
 
-    write_cache_with_meta_ids(docs_to_cache, None)
+    write_cache_with_meta_ids(docs_to_cache, None, data_release)
 
 
 if __name__ == "__main__":
@@ -63,6 +63,11 @@ if __name__ == "__main__":
         required=True,
         help="Input JSON as list of triplet queries (list of lists)",
     )
+    parser.add_argument(
+        "-r",
+        "--data-release",
+        help="Data release version to write into (default: the published release)",
+    )
     args = parser.parse_args()
 
     input_file = args.input
@@ -70,4 +75,4 @@ if __name__ == "__main__":
     with open(input_file) as fp:
         triplet_queries = ujson.load(fp)
 
-    generate_summary_cache(triplet_queries)
+    generate_summary_cache(triplet_queries, args.data_release)
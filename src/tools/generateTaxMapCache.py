@@ -30,7 +30,7 @@ _TAX_RANKS = [
 _TAX_THRESHOLD = 0.95
 
 
-def generate_tax_map_cache(triplet_queries):
+def generate_tax_map_cache(triplet_queries, data_release=None):
     docs_to_cache = {}
 
     for query in triplet_queries:
@@ -155,7 +155,7 @@ def generate_tax_map_cache(triplet_queries):
 
         docs_to_cache[tax_map_meta_id] = ujson.dumps(tax_map, default=str)
 
-    write_cache_with_meta_ids(docs_to_cache, None)
+    write_cache_with_meta_ids(docs_to_cache, None, data_release)
 
 
 if __name__ == "__main__":
@@ -168,6 +168,11 @@ if __name__ == "__main__":
         required=True,
         help="Input JSON as list of triplet queries (list of lists)",
     )
+    parser.add_argument(
+        "-r",
+        "--data-release",
+        help="Data release version to write into (default: the published release)",
+    )
     args = parser.parse_args()
 
     input_file = args.input
@@ -175,4 +180,4 @@ if __name__ == "__main__":
     with open(input_file) as fp:
         triplet_queries = ujson.load(fp)
 
-    generate_tax_map_cache(triplet_queries)
+    generate_tax_map_cache(triplet_queries, args.data_release)
@@ -0,0 +1,22 @@
+import sys
+import pathlib
+
+
+sys.path.append(pathlib.Path(__file__).parent.parent.resolve().as_posix())
+from util import publish_data_release_version
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-r",
+        "--data-release",
+        required=True,
+        help="Data release version to switch the Redis cache to",
+    )
+    args = parser.parse_args()
+
+    previous_version = publish_data_release_version(args.data_release)
+    print(f"Published data release {args.data_release} (previous: {previous_version})")
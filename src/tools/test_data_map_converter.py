@@ -0,0 +1,220 @@
+import csv
+import io
+import json
+import os
+import re
+import sys
+import pathlib
+import ujson
+from functools import partial
+
+import pandas as pd
+
+sys.path.append(pathlib.Path(__file__).parent.parent.resolve().as_posix())
+from data_map import DataMapConverter
+from util import DATA_MODEL_PATH
+
+# Differential test of data_map against the row-wise converter the DWC download used
+# to run as a subprocess per batch, followed by the download's read_json/to_csv round
+# trip. Known differences are not reported:
+# - Integer and boolean columns holding nulls went through pandas as floats (12.0,
+#   1.0), values are now written as in the document (12, True)
+# - Non-string values of formatted string fields and null or non-string items of
+#   array fields made the reference fail, such rows are skipped and counted
+
+###
+# Reference Converter
+###
+
+
+def reference_preprocess_string(row, bcdm_field, bcdm_format):
+    if pd.isnull(row[bcdm_field]):
+        return None
+
+    if re.match(rf"{bcdm_format.replace('%s', '.*')}", row[bcdm_field]):
+        return row[bcdm_field]
+    else:
+        return bcdm_format % (row[bcdm_field],)
+
+
+def reference_preprocess_date(row, bcdm_field, bcdm_format):
+    if pd.isnull(row[bcdm_field]):
+        return None
+
+    try:
+        return pd.to_datetime(row[bcdm_field]).strftime(bcdm_format)
+    except:
+        return None
+
+
+def reference_convert_string_to_array(row, bcdm_field):
+    if isinstance(row[bcdm_field], str):
+        return (
+            row[bcdm_field]
+            .replace("(", "", 1)[::-1]
+            .replace(")", "", 1)[::-1]
+            .split(",")
+        )
+    else:
+        return None
+
+
+def reference_convert_char_to_string(row, bcdm_field, dwc_format):
+    dwc_lookup = json.loads(dwc_format)
+    return dwc_lookup.get(row[bcdm_field], None)
+
+
+def reference_convert_array_to_string(row, bcdm_field, dwc_format):
+    return dwc_format % (",".join(row[bcdm_field]),)
+
+
+def convert_reference(rows, map_file):
+    map_df = pd.read_csv(map_file, delimiter="\t")
+    map_df = map_df[map_df["dwc_field"].notnull()]
+    col_rename_map = {
+        row.bcdm_field: row.dwc_field
+        for row in map_df[["bcdm_field", "dwc_field"]].itertuples()
+    }
+
+    preprocess_map = {}
+    conversion_map = {}
+    for row in map_df.itertuples():
+        if row.bcdm_format != "default":
+            if row.bcdm_type == "string":
+                preprocess_map[row.bcdm_field] = partial(
+                    reference_preprocess_string,
+                    bcdm_field=row.bcdm_field,
+                    bcdm_format=row.bcdm_format,
+                )
+            elif row.bcdm_type == "string:date":
+                preprocess_map[row.bcdm_field] = partial(
+                    reference_preprocess_date,
+                    bcdm_field=row.bcdm_field,
+                    bcdm_format=row.bcdm_format,
+                )
+
+        if row.bcdm_type != row.dwc_type:
+            if row.bcdm_type == "char" and row.dwc_type == "string":
+                conversion_map[row.bcdm_field] = partial(
+                    reference_convert_char_to_string,
+                    bcdm_field=row.bcdm_field,
+                    dwc_format=row.dwc_format,
+                )
+            elif row.bcdm_type == "string" and row.dwc_type == "array":
+                conversion_map[row.bcdm_field] = partial(
+                    reference_convert_string_to_array, bcdm_field=row.bcdm_field
+                )
+            elif row.bcdm_type == "array" and row.dwc_type == "string":
+                conversion_map[row.bcdm_field] = partial(
+                    reference_convert_array_to_string,
+                    bcdm_field=row.bcdm_field,
+                    dwc_format=row.dwc_format,
+                )
+
+    bcdm_json = "".join(f"{ujson.dumps(data, default=str)}\n" for data in rows)
+    df = pd.read_json(io.StringIO(bcdm_json), lines=True)
+    df = df.drop(
+        columns=df.columns.difference(col_rename_map.keys()),
+        errors="ignore",
+    )
+    for field, preprocess_func in preprocess_map.items():
+        if field in df.columns:
+            df[field] = df.apply(preprocess_func, axis=1)
+    for field, conversion_func in conversion_map.items():
+        if field in df.columns:
+            df[field] = df.apply(conversion_func, axis=1)
+    dwc_json = df.rename(columns=col_rename_map).to_json(orient="records", lines=True)
+
+    return pd.read_json(io.StringIO(dwc_json), lines=True).to_csv(index=False, sep="\t")
+
+
+###
+# Comparison
+###
+
+
+def convert(rows, map_file):
+    # As written by the dwc download format
+    converter = DataMapConverter(map_file)
+    fields = converter.get_fields()
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter="\t", lineterminator="\n")
+    writer.writerow([converter.rename_map[field] for field in fields])
+    writer.writerows(converter.convert(rows, fields).itertuples(index=False, name=None))
+
+    return buffer.getvalue()
+
+
+def _read_tsv(tsv):
+    return list(csv.DictReader(io.StringIO(tsv), delimiter="\t"))
+
+
+def _is_same_value(reference_value, value):
+    if reference_value == value:
+        return True
+
+    try:
+        return float(reference_value) == float(
+            {"True": 1, "False": 0}.get(value, value)
+        )
+    except ValueError:
+        return False
+
+
+def test_data_map_converter(input_file, map_file):
+    with open(input_file) as fp:
+        rows = [ujson.loads(line) for line in fp if line.strip()]
+
+    try:
+        reference_rows = _read_tsv(convert_reference(rows, map_file))
+    except Exception:
+        # The reference fails the whole batch on some values, so rows it cannot
+        # convert are found one by one and left out
+        kept_rows = []
+        for data in rows:
+            try:
+                convert_reference([data], map_file)
+                kept_rows.append(data)
+            except Exception:
+                pass
+
+        print(f"{len(rows) - len(kept_rows)} row(s) failing the reference skipped")
+        rows = kept_rows
+        reference_rows = _read_tsv(convert_reference(rows, map_file))
+
+    converted_rows = _read_tsv(convert(rows, map_file))
+    assert len(reference_rows) == len(converted_rows), "Row counts differ"
+
+    differences = 0
+    for line, (reference_row, row) in enumerate(zip(reference_rows, converted_rows)):
+        # The reference only has the columns present in its batch
+        for field, value in row.items():
+            reference_value = reference_row.get(field, "")
+            if not _is_same_value(reference_value, value):
+                differences += 1
+                print(f"Row {line + 1} {field}: {reference_value!r} != {value!r}")
+
+    print(f"{len(converted_rows)} row(s) compared, {differences} difference(s)")
+    assert differences == 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--input",
+        required=True,
+        help="Input BCDM JSON lines file",
+    )
+    parser.add_argument(
+        "-m",
+        "--map",
+        default=os.path.join(DATA_MODEL_PATH, "mapping_BCDM_to_DWC.tsv"),
+        help="Data map file (default: BCDM to DWC map of the data model)",
+    )
+    args = parser.parse_args()
+
+    test_data_map_converter(args.input, args.map)
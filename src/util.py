@@ -1,15 +1,24 @@
 from fastapi import HTTPException, status
 
+import array
 import base64
+import contextlib
 import csv
 import datetime
+import functools
 import logging
+import mmap
+import os
 import pathlib
 import redis
+import struct
+import time
 import ujson
 import zlib
+import zstandard
 
 from settings import settings
+import disk_cache
 
 sec_logger = logging.getLogger("sec_logger")
 
@@ -27,7 +36,54 @@ _REDIS_POOL = redis.ConnectionPool(
     encoding="utf-8",
     decode_responses=True,
 )
+_REDIS_VALUE_POOL = redis.ConnectionPool(
+    host=settings.redis_host,
+    port=settings.redis_port,
+    db=settings.redis_db,
+)
 _REDIS_TTL = 604800  # 7 days
+_SINGLE_FLIGHT_TTL = 300  # Seconds a worker may hold a query lock and share its result
+_DATA_RELEASE_KEY = "data-release"
+_RETIRED_DATA_RELEASES_KEY = "data-release:retired"
+_LEGACY_DATA_RELEASE = ""  # Retired release of the keys cached before any release
+_DATA_RELEASE_CONTROL_KEYS = (
+    _DATA_RELEASE_KEY,
+    "single-flight-lock:",
+    "single-flight-waiters:",
+)
+_DATA_RELEASE_REFRESH = 5  # Seconds a worker reuses the data release version it read
+_DATA_RELEASE = {"version": None, "checked": float("-inf")}
+
+# Redis value codecs: compressed values start with the codec's header byte. Values are
+# JSON text, which never starts with a control character, so plain values (small ones,
+# or written before compression) decode as they are
+_REDIS_CODEC_MIN_SIZE = 512  # Bytes below which values are stored uncompressed
+_REDIS_CODECS = {
+    "zlib": (
+        b"\x01",
+        lambda data: zlib.compress(data, settings.redis_codec_level),
+        zlib.decompress,
+    ),
+    "zstd": (
+        b"\x02",
+        lambda data: zstandard.ZstdCompressor(settings.redis_codec_level).compress(
+            data
+        ),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    ),
+}
+_REDIS_DECODERS = {
+    header[0]: decompress for header, _, decompress in _REDIS_CODECS.values()
+}
+
+# Query cache files: header (magic, count, created, size of the marker suffix table),
+# the suffix table, prefix byte offsets, per-ID suffix codes, then the prefix bytes
+_QUERY_CACHE_MAGIC = b"BQC1"
+_QUERY_CACHE_HEADER = struct.Struct("=4sQdI")
+_QUERY_CACHE_OFFSET_TYPECODE = "I"  # Unsigned 32-bit ints
+_QUERY_CACHE_OFFSET_ITEMSIZE = array.array(_QUERY_CACHE_OFFSET_TYPECODE).itemsize
+_QUERY_CACHE_CODE_TYPECODE = "H"  # Unsigned 16-bit ints
+_QUERY_CACHE_CODE_ITEMSIZE = array.array(_QUERY_CACHE_CODE_TYPECODE).itemsize
 
 # Triplets configuration
 _SCOPE_MAP = {
@@ -159,69 +215,439 @@ def get_triplets_from_query_id(query_id):
     )
 
 
-def get_cache_from_query_id(query_id):
-    cache_file = pathlib.Path(settings.cache_path, f"{query_id}.txt")
+def _get_query_cache_file(query_id):
+    return pathlib.Path(settings.cache_path, f"{query_id}.bin")
+
+
+def _encode_query_cache(data, split_suffixes=True):
+    # Meta IDs are "{processid}.{marker}" and a result set only spans a handful of
+    # markers, so each ID is stored as its process ID plus a 2-byte marker code
+    suffixes = {}
+    codes = array.array(_QUERY_CACHE_CODE_TYPECODE)
+    offsets = array.array(_QUERY_CACHE_OFFSET_TYPECODE, [0])
+    prefixes = []
+
+    for meta_id in data:
+        prefix, separator, suffix = meta_id.rpartition(".")
+        if not split_suffixes or not separator:
+            prefix, suffix = meta_id, ""
+        else:
+            suffix = separator + suffix
+
+        if (code := suffixes.setdefault(suffix, len(suffixes))) > 0xFFFF:
+            return _encode_query_cache(data, split_suffixes=False)
+
+        prefix = prefix.encode()
+        prefixes.append(prefix)
+        codes.append(code)
+        offsets.append(offsets[-1] + len(prefix))
+
+    suffixes = "\n".join(suffixes).encode()
+    header = _QUERY_CACHE_HEADER.pack(
+        _QUERY_CACHE_MAGIC, len(data), time.time(), len(suffixes)
+    )
+
+    return b"".join([header, suffixes, offsets.tobytes(), codes.tobytes(), *prefixes])
+
+
+def _read_query_cache_header(buffer):
+    magic, count, created, suffixes_size = _QUERY_CACHE_HEADER.unpack_from(buffer)
+    if magic != _QUERY_CACHE_MAGIC:
+        raise ValueError("Unrecognised query cache format")
+
+    suffixes_position = _QUERY_CACHE_HEADER.size
+    offsets_position = suffixes_position + suffixes_size
+    codes_position = offsets_position + (count + 1) * _QUERY_CACHE_OFFSET_ITEMSIZE
+    prefixes_position = codes_position + count * _QUERY_CACHE_CODE_ITEMSIZE
+
+    return {
+        "count": count,
+        "created": created,
+        "suffixes": buffer[suffixes_position:offsets_position].decode().split("\n"),
+        "offsets_position": offsets_position,
+        "codes_position": codes_position,
+        "prefixes_position": prefixes_position,
+    }
+
+
+def _decode_query_cache(buffer, header, start, stop):
+    # Only the offsets, codes and bytes of the requested range are read from the map
+    start, stop = min(start, header["count"]), min(stop, header["count"])
+    if start >= stop:
+        return []
+
+    offsets_position = header["offsets_position"] + start * _QUERY_CACHE_OFFSET_ITEMSIZE
+    offsets = array.array(_QUERY_CACHE_OFFSET_TYPECODE)
+    offsets.frombytes(
+        buffer[
+            offsets_position : offsets_position
+            + (stop - start + 1) * _QUERY_CACHE_OFFSET_ITEMSIZE
+        ]
+    )
+
+    codes_position = header["codes_position"] + start * _QUERY_CACHE_CODE_ITEMSIZE
+    codes = array.array(_QUERY_CACHE_CODE_TYPECODE)
+    codes.frombytes(
+        buffer[
+            codes_position : codes_position
+            + (stop - start) * _QUERY_CACHE_CODE_ITEMSIZE
+        ]
+    )
+
+    prefixes_position = header["prefixes_position"]
+    prefixes = buffer[prefixes_position + offsets[0] : prefixes_position + offsets[-1]]
+    suffixes = header["suffixes"]
+
+    return [
+        prefixes[offsets[i] - offsets[0] : offsets[i + 1] - offsets[0]].decode()
+        + suffixes[code]
+        for i, code in enumerate(codes)
+    ]
+
+
+@contextlib.contextmanager
+def _open_query_cache(query_id, record=False):
+    # Yields the parsed header and the memory-mapped cache, or None when not cached.
+    # Only the lookups checking for a cached query are recorded as hits or misses,
+    # reads of a query already looked up (slices, pages) only touch the entry
+    cache_file = _get_query_cache_file(query_id)
+    if not cache_file.exists() and not _upgrade_legacy_query_cache(query_id):
+        if record:
+            disk_cache.record_miss()
+        yield None, None
+        return
+
+    if record:
+        disk_cache.record_hit(cache_file)
+    else:
+        disk_cache.touch(cache_file)
+    with open(cache_file, "rb") as fp, mmap.mmap(
+        fp.fileno(), 0, access=mmap.ACCESS_READ
+    ) as buffer:
+        yield _read_query_cache_header(buffer), buffer
+
+
+def _upgrade_legacy_query_cache(query_id):
+    # Caches written as newline separated text are converted once on first read
+    legacy_cache_file = pathlib.Path(settings.cache_path, f"{query_id}.txt")
     try:
-        with open(cache_file) as fp:
-            return fp.read().splitlines()
-    except:
+        with open(legacy_cache_file) as fp:
+            data = fp.read().splitlines()
+    except OSError:
+        return False
+
+    write_cache_with_query_id(query_id, data)
+    legacy_cache_file.unlink(missing_ok=True)
+    pathlib.Path(settings.cache_path, f"{query_id}.index").unlink(missing_ok=True)
+    return True
+
+
+def get_cache_count_from_query_id(query_id):
+    try:
+        with _open_query_cache(query_id, record=True) as (header, _):
+            return None if header is None else header["count"]
+    except (OSError, ValueError):
+        return None
+
+
+def get_cache_slice_from_query_id(query_id, start, length):
+    if length <= 0:
+        return []
+
+    try:
+        with _open_query_cache(query_id) as (header, buffer):
+            if header is None:
+                return []
+            return _decode_query_cache(buffer, header, start, start + length)
+    except (OSError, ValueError):
+        return []
+
+
+def get_cache_page_after_from_query_id(query_id, cursor, length):
+    # Keyset paging: the cursor is located by binary search over the sorted IDs, so
+    # deep pages cost the same as the first one
+    if not cursor:
+        return get_cache_slice_from_query_id(query_id, 0, length)
+
+    if length <= 0:
+        return []
+
+    try:
+        with _open_query_cache(query_id) as (header, buffer):
+            if header is None:
+                return []
+
+            low, high = 0, header["count"]
+            while low < high:
+                mid = (low + high) // 2
+                if _decode_query_cache(buffer, header, mid, mid + 1)[0] <= cursor:
+                    low = mid + 1
+                else:
+                    high = mid
+
+            return _decode_query_cache(buffer, header, low, low + length)
+    except (OSError, ValueError):
         return []
 
 
 def write_cache_with_query_id(query_id, data):
-    cache_file = pathlib.Path(settings.cache_path, f"{query_id}.txt")
+    # IDs are stored sorted in a compact binary file that is memory-mapped on read,
+    # so counts and pages never decode the whole set
+    data = sorted(data)
+
+    cache_file = _get_query_cache_file(query_id)
     cache_file.parent.mkdir(parents=True, exist_ok=True)
-    with open(cache_file, "w") as fp:
-        fp.write("\n".join(data))
+
+    # Written aside and renamed so readers never map a partially written file
+    partial_cache_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    with open(partial_cache_file, "wb") as fp:
+        fp.write(_encode_query_cache(data))
+    os.replace(partial_cache_file, cache_file)
 
     cache_metadata_file = pathlib.Path(settings.cache_path, f"{query_id}.metadata.json")
-    metadata = {"created": str(datetime.datetime.now())}
+    metadata = {"created": str(datetime.datetime.now()), "count": len(data)}
     with open(cache_metadata_file, "w") as fp:
         ujson.dump(metadata, fp)
 
 
-def get_cache_from_meta_ids(meta_ids):
+def get_data_release_version():
+    # Read from Redis at most every few seconds, so a published release reaches every
+    # worker shortly after the bump without a round trip on each cache access
+    now = time.monotonic()
+    if now - _DATA_RELEASE["checked"] >= _DATA_RELEASE_REFRESH:
+        try:
+            with redis.StrictRedis(connection_pool=_REDIS_POOL) as redis_conn:
+                _DATA_RELEASE["version"] = redis_conn.get(_DATA_RELEASE_KEY)
+        except redis.exceptions.ConnectionError:
+            pass
+        _DATA_RELEASE["checked"] = now
+
+    return _DATA_RELEASE["version"]
+
+
+def generate_versioned_meta_ids(meta_ids, version=None):
+    # Keys are namespaced by data release, so publishing a release switches every
+    # cache at once. Until a release is published keys are left unprefixed
+    if version is None:
+        version = get_data_release_version()
+
+    if not version:
+        return list(meta_ids)
+
+    return [f"{version}:{meta_id}" for meta_id in meta_ids]
+
+
+def publish_data_release_version(version):
+    # The first release also retires the unprefixed keys cached until then, some of
+    # which (e.g. stats) never expire
+    with redis.StrictRedis(connection_pool=_REDIS_POOL) as redis_conn:
+        previous_version = redis_conn.set(_DATA_RELEASE_KEY, version, get=True)
+        redis_conn.srem(_RETIRED_DATA_RELEASES_KEY, version)
+        if previous_version is None:
+            redis_conn.sadd(_RETIRED_DATA_RELEASES_KEY, _LEGACY_DATA_RELEASE)
+        elif previous_version != version:
+            redis_conn.sadd(_RETIRED_DATA_RELEASES_KEY, previous_version)
+
+    return previous_version
+
+
+def _scan_data_release_keys(redis_conn, version, batch_size):
+    if version != _LEGACY_DATA_RELEASE:
+        yield from redis_conn.scan_iter(match=f"{version}:*", count=batch_size)
+        return
+
+    # Unprefixed keys are those not starting with a known release or a control key
+    versions = redis_conn.smembers(_RETIRED_DATA_RELEASES_KEY)
+    versions.add(redis_conn.get(_DATA_RELEASE_KEY))
+    for key in redis_conn.scan_iter(count=batch_size):
+        release, separator, _ = key.partition(":")
+        if not (separator and release in versions) and not key.startswith(
+            _DATA_RELEASE_CONTROL_KEYS
+        ):
+            yield key
+
+
+def collect_retired_data_releases(batch_size=1000):
+    # Keys of replaced releases are deleted in the background by whichever worker
+    # holds the lock, rather than flushing Redis when a release is published
     try:
         with redis.StrictRedis(connection_pool=_REDIS_POOL) as redis_conn:
-            return redis_conn.mget(meta_ids)
+            lock = redis_conn.lock(f"{_RETIRED_DATA_RELEASES_KEY}:lock", timeout=3600)
+            if not lock.acquire(blocking=False):
+                return 0
+
+            deleted = 0
+            try:
+                for version in redis_conn.smembers(_RETIRED_DATA_RELEASES_KEY):
+                    batch = []
+                    for key in _scan_data_release_keys(redis_conn, version, batch_size):
+                        batch.append(key)
+                        if len(batch) >= batch_size:
+                            deleted += redis_conn.unlink(*batch)
+                            batch = []
+                    if batch:
+                        deleted += redis_conn.unlink(*batch)
+
+                    redis_conn.srem(_RETIRED_DATA_RELEASES_KEY, version)
+            finally:
+                release_single_flight_lock(lock)
+
+            return deleted
+    except redis.exceptions.ConnectionError:
+        return 0
+
+
+def encode_cache_value(data, codec=None):
+    data = data.encode() if isinstance(data, str) else data
+    if len(data) < _REDIS_CODEC_MIN_SIZE:
+        return data
+
+    # Unknown codecs fall back to zlib
+    codec = settings.redis_codec if codec is None else codec
+    if codec == "none":
+        return data
+    header, compress, _ = _REDIS_CODECS.get(codec, _REDIS_CODECS["zlib"])
+
+    return header + compress(data)
+
+
+def decode_cache_value(value):
+    if not value:
+        return None if value is None else ""
+
+    if (decompress := _REDIS_DECODERS.get(value[0])) is not None:
+        return decompress(value[1:]).decode()
+
+    # Values written by a codec this worker lacks are treated as cache misses
+    if value[0] < 0x20 and value[0] not in b"\t\n\r":
+        return None
+
+    return value.decode()
+
+
+def get_cache_from_meta_ids(meta_ids, version=None):
+    try:
+        with redis.StrictRedis(connection_pool=_REDIS_VALUE_POOL) as redis_conn:
+            values = redis_conn.mget(generate_versioned_meta_ids(meta_ids, version))
     except redis.exceptions.ConnectionError:
         return [None] * len(meta_ids)
 
+    return [decode_cache_value(value) for value in values]
 
-def write_cache_with_meta_ids(meta_ids_and_data, ttl=_REDIS_TTL):
+
+def write_cache_with_meta_ids(meta_ids_and_data, ttl=_REDIS_TTL, version=None):
+    # An explicit version writes ahead into a release before it is published
     try:
-        with redis.StrictRedis(connection_pool=_REDIS_POOL) as redis_conn:
+        with redis.StrictRedis(connection_pool=_REDIS_VALUE_POOL) as redis_conn:
             pipeline = redis_conn.pipeline(transaction=False)
-            for meta_id, data in meta_ids_and_data.items():
-                pipeline.set(meta_id, data, ex=ttl)
+            for meta_id, data in zip(
+                generate_versioned_meta_ids(meta_ids_and_data.keys(), version),
+                meta_ids_and_data.values(),
+            ):
+                pipeline.set(meta_id, encode_cache_value(data), ex=ttl)
             return pipeline.execute()
     except redis.exceptions.ConnectionError:
         return [False] * len(meta_ids_and_data)
 
 
-def get_default_data_model_object():
-    data_model = {}
+def acquire_single_flight_lock(key, timeout=_SINGLE_FLIGHT_TTL):
+    # Without Redis there is no lock to share, so every worker runs its own query
+    try:
+        redis_conn = redis.StrictRedis(connection_pool=_REDIS_POOL)
+        lock = redis_conn.lock(f"single-flight-lock:{key}", timeout=timeout)
+        return lock, lock.acquire(blocking=False)
+    except redis.exceptions.ConnectionError:
+        return None, True
+
+
+def extend_single_flight_lock(lock):
+    # Resets the lock expiry while its holder is still running the query
+    try:
+        if lock is not None:
+            lock.reacquire()
+    except (redis.exceptions.ConnectionError, redis.exceptions.LockError):
+        pass
+
+
+def is_single_flight_locked(lock):
+    try:
+        return lock is not None and lock.locked()
+    except redis.exceptions.ConnectionError:
+        return False
+
+
+def release_single_flight_lock(lock):
+    try:
+        if lock is not None:
+            lock.release()
+    except (redis.exceptions.ConnectionError, redis.exceptions.LockError):
+        pass
+
+
+def add_single_flight_waiter(key, ttl=_SINGLE_FLIGHT_TTL):
+    try:
+        with redis.StrictRedis(connection_pool=_REDIS_POOL) as redis_conn:
+            pipeline = redis_conn.pipeline()
+            pipeline.incr(f"single-flight-waiters:{key}")
+            pipeline.expire(f"single-flight-waiters:{key}", ttl)
+            pipeline.execute()
+    except redis.exceptions.ConnectionError:
+        pass
+
+
+def pop_single_flight_waiters(key):
+    # Number of workers waiting on the lock holder's result, reset for the next holder
+    try:
+        with redis.StrictRedis(connection_pool=_REDIS_POOL) as redis_conn:
+            pipeline = redis_conn.pipeline()
+            pipeline.get(f"single-flight-waiters:{key}")
+            pipeline.delete(f"single-flight-waiters:{key}")
+            waiters, _ = pipeline.execute()
+    except redis.exceptions.ConnectionError:
+        return 0
 
+    return int(waiters or 0)
+
+
+@functools.cache
+def get_data_model_schema():
+    # BCDM field names in field_definitions.tsv order, read once per process
     with open(f"{DATA_MODEL_PATH}/field_definitions.tsv") as fp:
         tsv_file = csv.reader(fp, delimiter="\t")
 
         # Skip header
         _ = next(tsv_file)
 
-        for line in tsv_file:
-            data_model[line[0]] = None
+        return tuple(line[0] for line in tsv_file)
+
+
+@functools.cache
+def _get_data_model_fields():
+    return frozenset(get_data_model_schema())
 
-    return data_model
+
+def build_data_model_row(document):
+    # Rows are built in BCDM schema order whatever the document key order, with
+    # missing fields set to None. Extra fields are kept after the schema
+    row = {field: document.get(field) for field in get_data_model_schema()}
+    if not document.keys() <= _get_data_model_fields():
+        row.update(document)
+
+    return row
 
 
 def get_summary_cache_from_query_id(query_id):
     cache_file = pathlib.Path(settings.cache_path, f"{query_id}.summary.txt")
     try:
         with open(cache_file) as fp:
-            return fp.read().splitlines()
+            data = fp.read().splitlines()
     except:
+        disk_cache.record_miss()
         return []
 
+    disk_cache.record_hit(cache_file)
+    return data
+
 
 def write_summary_cache_with_query_id(query_id, data):
     cache_file = pathlib.Path(settings.cache_path, f"{query_id}.summary.txt")
@@ -268,6 +694,22 @@ def generate_tax_map_meta_id(query_id, node_threshold):
     return f"tax-map:{query_id},{node_threshold}"
 
 
+def generate_term_meta_id(term):
+    return f"term:{term}"
+
+
+def generate_search_meta_id(query_id):
+    return f"search:{query_id}"
+
+
+def generate_page_meta_id(url):
+    return f"page:{url}"
+
+
+def generate_single_flight_meta_id(key):
+    return f"single-flight:{key}"
+
+
 ###
 # Security
 ###
@@ -1,83 +1,230 @@
+from fastapi import HTTPException, status
+from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
-from collections import defaultdict
+import asyncio
+import contextvars
 import datetime
-import dateutil.parser
+import functools
+import httpx
+import logging
+import numpy as np
+import time
+import urllib.parse
+
+from settings import settings
+from util import (
+    acquire_single_flight_lock,
+    generate_page_meta_id,
+    get_app_url,
+    get_cache_from_meta_ids,
+    get_data_release_version,
+    release_single_flight_lock,
+    write_cache_with_meta_ids,
+)
+
+exc_logger = logging.getLogger("exc_logger")
 
 templates = Jinja2Templates(directory="templates")
 
 
 _YEAR_THRESHOLD = 50  # Aggregate all date counts older than this year - _YEAR_THRESHOLD
 _DATE_THRESHOLD = 0.975  # Ignore percentage of older dates during accumulation
+_HISTOGRAM_CACHE_SIZE = 1024  # Date histograms memoised per worker
+
+# Rendering state of the page in progress, shared with the tasks it gathers from so
+# pages missing optional data are not cached
+_PAGE_STATE = contextvars.ContextVar("page_state", default=None)
+_PAGE_REFRESHES = set()
+
+
+def _get_months(date_counts):
+    # Months of the ISO date keys, "YYYY-MM" as aggregated by the ETL or full dates,
+    # with their counts. Keys that are not dates (e.g. null) are left out
+    dates = np.array(list(date_counts.keys()), dtype="U7")
+    counts = np.fromiter(date_counts.values(), dtype=np.int64, count=len(dates))
+
+    try:
+        months = dates.astype("datetime64[M]")
+    except ValueError:
+        months = np.empty(len(dates), dtype="datetime64[M]")
+        for i, date in enumerate(dates):
+            try:
+                months[i] = np.datetime64(date, "M")
+            except ValueError:
+                months[i] = np.datetime64("NaT")
+
+    valid = ~np.isnat(months)
+    return months[valid].astype(np.int64), counts[valid]
+
+
+def _generate_histogram(months, counts, current_month):
+    # Counts per month from the first month up to the current one, so months without
+    # dates are included with a count of 0
+    start = months.min()
+    stop = max(months.max(), current_month)
+    histogram = np.bincount(months - start, weights=counts, minlength=stop - start + 1)
+    present = np.zeros(len(histogram), dtype=bool)
+    present[months - start] = True
+
+    labels = np.arange(start, stop + 1).astype("datetime64[M]").astype(str)
+    return labels, histogram.astype(np.int64), present
+
+
+def _memoise_histogram(generate):
+    # Summaries only change with a data release, so histograms are memoised on the
+    # summary's date counts, the release and the current month
+    @functools.lru_cache(maxsize=_HISTOGRAM_CACHE_SIZE)
+    def generate_cached(date_counts, current_month, version):
+        months, counts = _get_months(dict(date_counts))
+        if not len(months):
+            return {}
+
+        return generate(months, counts, current_month)
+
+    @functools.wraps(generate)
+    def generate_histogram(date_counts):
+        if not date_counts:
+            return {}
+
+        current_month = np.datetime64(datetime.date.today(), "M").astype(np.int64)
+        histogram = generate_cached(
+            tuple(date_counts.items()), current_month, get_data_release_version()
+        )
+        return dict(histogram)
+
+    return generate_histogram
+
+
+@_memoise_histogram
+def generate_date_histogram(months, counts, current_month):
+    min_month = np.datetime64(
+        datetime.date.today() - datetime.timedelta(days=_YEAR_THRESHOLD * 365), "M"
+    ).astype(np.int64)
+
+    labels, histogram, _ = _generate_histogram(
+        np.maximum(months, min_month), counts, current_month
+    )
+    return dict(zip(labels.tolist(), histogram.tolist()))
+
+
+@_memoise_histogram
+def generate_cumulative_date_histogram(months, counts, current_month):
+    labels, histogram, present = _generate_histogram(months, counts, current_month)
+
+    # Leave out the oldest months, holding the last 1 - _DATE_THRESHOLD of the dates
+    remaining = np.cumsum(histogram[::-1])[::-1]
+    dropped = (remaining - histogram > 0) & (remaining > _DATE_THRESHOLD * remaining[0])
+    first = np.argmax(present & ~dropped)
+
+    cumulative = np.cumsum(histogram[first:])
+    return dict(zip(labels[first:].tolist(), cumulative.tolist()))
+
+
+def generate_api_url(path, params=None):
+    # Pages are composed from the services in-process; the equivalent API calls are
+    # still listed on the page for debugging
+    return httpx.URL(f"{get_app_url()}/api{path}", params=params)
+
+
+async def fetch_page_data(awaitable, timeout=None):
+    # Data a page cannot render without; the page fails if it is not ready in time
+    try:
+        return await asyncio.wait_for(awaitable, timeout or settings.view_timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"Page failed to load, please try again",
+        )
+
+
+async def fetch_optional_page_data(awaitable, default=None, timeout=None):
+    # Data a page can render without; on failure or timeout the default is used
+    try:
+        return await asyncio.wait_for(
+            awaitable, timeout or settings.view_optional_timeout
+        )
+    except Exception as exc:
+        exc_logger.warning(f"Optional page data unavailable: {exc!r}")
+        if (state := _PAGE_STATE.get()) is not None:
+            state["complete"] = False
+        return default
+
+
+###
+# Page Cache
+###
+
+
+async def _render_page(view, kwargs):
+    state = {"complete": True}
+    token = _PAGE_STATE.set(state)
+    try:
+        response = await view(**kwargs)
+    finally:
+        _PAGE_STATE.reset(token)
+
+    return response, state["complete"]
+
+
+def _write_page(meta_id, response, complete):
+    if not complete or response.status_code != status.HTTP_200_OK:
+        return
+
+    write_cache_with_meta_ids(
+        {meta_id: f"{time.time()}\n{response.body.decode()}"},
+        settings.page_cache_ttl + settings.page_cache_stale,
+    )
+
+
+async def _refresh_page(meta_id, view, kwargs):
+    # One worker re-renders a stale page while every other keeps serving it
+    lock, acquired = await asyncio.to_thread(acquire_single_flight_lock, meta_id)
+    if not acquired:
+        return
+
+    try:
+        response, complete = await _render_page(view, kwargs)
+        await asyncio.to_thread(_write_page, meta_id, response, complete)
+    except Exception:
+        exc_logger.exception(f"Failed to refresh cached page {meta_id}")
+    finally:
+        await asyncio.to_thread(release_single_flight_lock, lock)
+
+
+def cache_page(view):
+    # Entity pages are the same for everyone until the next data release, so the
+    # rendered HTML is cached in Redis by path and sorted query parameters (keys are
+    # namespaced by data release). Redis calls run in threads off the event loop
+    @functools.wraps(view)
+    async def cached_view(**kwargs):
+        request = kwargs["request"]
+        if not settings.page_cache_ttl:
+            return await view(**kwargs)
+
+        query = urllib.parse.urlencode(sorted(request.query_params.multi_items()))
+        meta_id = generate_page_meta_id(f"{request.url.path}?{query}")
+
+        cached = None
+        if "no-cache" not in request.headers.get("cache-control", ""):
+            cached = (await asyncio.to_thread(get_cache_from_meta_ids, [meta_id]))[0]
+
+        if cached is not None:
+            created, _, body = cached.partition("\n")
+            age = time.time() - float(created)
+
+            if age < settings.page_cache_ttl:
+                return HTMLResponse(body, headers={"X-Page-Cache": "HIT"})
+
+            if age < settings.page_cache_ttl + settings.page_cache_stale:
+                task = asyncio.create_task(_refresh_page(meta_id, view, kwargs))
+                _PAGE_REFRESHES.add(task)
+                task.add_done_callback(_PAGE_REFRESHES.discard)
+                return HTMLResponse(body, headers={"X-Page-Cache": "STALE"})
+
+        response, complete = await _render_page(view, kwargs)
+        await asyncio.to_thread(_write_page, meta_id, response, complete)
+        response.headers["X-Page-Cache"] = "MISS"
 
+        return response
 
-def generate_date_histogram(date_counts):
-    if not date_counts:
-        return {}
-
-    min_date_float = (
-        datetime.datetime.now() - datetime.timedelta(days=_YEAR_THRESHOLD * 365)
-    ).strftime("%Y-%m")
-
-    histogram = defaultdict(lambda: 0)
-    for date, count in date_counts.items():
-        date_float = dateutil.parser.isoparse(date).strftime("%Y-%m")
-        if date_float < min_date_float:
-            histogram[min_date_float] += count
-        else:
-            histogram[date_float] += count
-
-    min_date = sorted(histogram.keys())[0]
-    max_date = datetime.datetime.now().strftime("%Y-%m")
-    min_year, min_month = (int(x) for x in min_date.split("-"))
-    max_year, max_month = (int(x) for x in max_date.split("-"))
-    for year in range(min_year, max_year + 1):
-        for i in range(12):
-            i += 1
-            if year == min_year and i < min_month:
-                continue
-            if year == max_year and i > max_month:
-                continue
-            year_month = f"{year}-{i:02}"
-            if year_month not in histogram:
-                histogram[year_month] = 0
-
-    return histogram
-
-
-def generate_cumulative_date_histogram(date_counts):
-    if not date_counts:
-        return {}
-
-    histogram = defaultdict(lambda: 0)
-    for date, count in date_counts.items():
-        date_float = dateutil.parser.isoparse(date).strftime("%Y-%m")
-        histogram[date_float] += count
-
-    cumulative_date_counts = 0
-    total_date_counts = sum(histogram.values())
-    for date in sorted(histogram.keys(), reverse=True):
-        cumulative_date_counts += histogram[date]
-        if (
-            cumulative_date_counts - histogram[date] > 0
-            and cumulative_date_counts / total_date_counts > _DATE_THRESHOLD
-        ):
-            histogram.pop(date)
-
-    cumulative_date_counts = 0
-    min_date = sorted(histogram.keys())[0]
-    max_date = datetime.datetime.now().strftime("%Y-%m")
-    min_year, min_month = (int(x) for x in min_date.split("-"))
-    max_year, max_month = (int(x) for x in max_date.split("-"))
-    for year in range(min_year, max_year + 1):
-        for i in range(12):
-            i += 1
-            if year == min_year and i < min_month:
-                continue
-            if year == max_year and i > max_month:
-                continue
-            year_month = f"{year}-{i:02}"
-            if year_month in histogram:
-                cumulative_date_counts += histogram[year_month]
-            histogram[year_month] = cumulative_date_counts
-
-    return histogram
+    return cached_view
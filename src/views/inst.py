@@ -1,12 +1,22 @@
 from fastapi import APIRouter, Request, Path, Query, HTTPException, status
 from fastapi.responses import HTMLResponse
+import asyncio
 import ujson as json
 
-from views import templates, generate_date_histogram
+from views import (
+    templates,
+    cache_page,
+    fetch_optional_page_data,
+    fetch_page_data,
+    generate_api_url,
+    generate_date_histogram,
+)
 
-import httpx
 from collections import defaultdict
-from util import get_app_url, get_triplets_from_query_id
+from services.images import summarize_images
+from services.query import run_query
+from services.summary import summarize_query
+from util import get_triplets_from_query_id
 
 route = APIRouter(tags=["views"])
 
@@ -29,101 +39,104 @@ async def show_institution_home(
 
 
 @route.get("/institution/{name}", response_class=HTMLResponse)
+@cache_page
 async def show_institution(
     request: Request,
     name: str = Path(title="Institution name"),
     extent: str = Query("limited", title="Document extent"),
 ):
     urls = [request.url]
-    try:
-        async with httpx.AsyncClient(timeout=None) as client:
-            query = f"inst:name:{name}"
-            query_as_seq_site = f"inst:seqsite:{name}"
-
-            params = {
-                "query": query,
-                "fields": ",".join(
-                    [
-                        "specimens",
-                        "marker_code",
-                        "bin_uri",
-                        "species",
-                        "inst",
-                        "sequence_run_site",
-                        "identified_by",
-                        "sequence_upload_date",
-                        "collection_date_start",
-                    ]
-                ),
-            }
-            resp = await client.get(url=f"{get_app_url()}/api/summary", params=params)
-            resp.raise_for_status()
-            urls.append(resp.url)
-            summary = defaultdict(lambda: defaultdict(lambda: 0))
-            summary.update(resp.json())
-            count = summary["counts"]["specimens"]
-
-            if count == 0:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Institution {name} not found",
-                )
-
-            stats = {
-                "specimens": summary["counts"]["specimens"],
-                "sequences": sum(summary["marker_code"].values()),
-                "records_w_bins": sum(summary["bin_uri"].values()),
-                "records_w_species": sum(summary["species"].values()),
-                "bins": len(summary["bin_uri"]),
-                "species": len(summary["species"]),
-                "institutions": len(summary["inst"]),
-            }
-
-            params = {
-                "query": query_as_seq_site,
-                "fields": ",".join(
-                    [
-                        "marker_code",
-                        "inst",
-                    ]
-                ),
-            }
-            resp = await client.get(url=f"{get_app_url()}/api/summary", params=params)
-            resp.raise_for_status()
-            urls.append(resp.url)
-            summary_as_seq_site = defaultdict(lambda: defaultdict(lambda: 0))
-            summary_as_seq_site.update(resp.json())
-
-            stats_as_seq_site = {
-                "sequences": sum(summary_as_seq_site["marker_code"].values()),
-            }
-
-            params = {"query": query, "extent": extent}
-            resp = await client.get(url=f"{get_app_url()}/api/query", params=params)
-            resp.raise_for_status()
-            urls.append(resp.url)
-            query_resp = resp.json()
-            query_id = query_resp["query_id"]
-            extent_limit = query_resp["extent_limit"]
-            triplets = get_triplets_from_query_id(query_id)
-
-            resp = await client.get(
-                url=f"{get_app_url()}/api/images/{query_id}",
-            )
-            resp.raise_for_status()
-            urls.append(resp.url)
-            image_response = resp.json()
-
-            image_count = 0
-            for images in image_response["images"].values():
-                image_count += len(images)
-
-    except httpx.HTTPStatusError:
+    query = f"inst:name:{name}"
+    query_as_seq_site = f"inst:seqsite:{name}"
+
+    summary_params = {
+        "query": query,
+        "fields": ",".join(
+            [
+                "specimens",
+                "marker_code",
+                "bin_uri",
+                "species",
+                "inst",
+                "sequence_run_site",
+                "identified_by",
+                "sequence_upload_date",
+                "collection_date_start",
+            ]
+        ),
+    }
+    summary_as_seq_site_params = {
+        "query": query_as_seq_site,
+        "fields": ",".join(
+            [
+                "marker_code",
+                "inst",
+            ]
+        ),
+    }
+    query_params = {"query": query, "extent": extent}
+
+    async def fetch_query_with_images():
+        # Images are not required to render the page, so it is rendered without them if
+        # slow. They only need the query ID, so start while the summaries are pending
+        query_resp = await fetch_page_data(run_query(**query_params))
+        image_response = await fetch_optional_page_data(
+            summarize_images(query_resp["query_id"])
+        )
+        return query_resp, image_response
+
+    # The sequencing site summary is not required, so it is left empty if slow
+    summary_resp, summary_as_seq_site_resp, (query_resp, image_response) = (
+        await asyncio.gather(
+            fetch_page_data(summarize_query(**summary_params)),
+            fetch_optional_page_data(
+                summarize_query(**summary_as_seq_site_params), default={}
+            ),
+            fetch_query_with_images(),
+        )
+    )
+    urls.append(generate_api_url("/summary", summary_params))
+    urls.append(generate_api_url("/summary", summary_as_seq_site_params))
+    urls.append(generate_api_url("/query", query_params))
+    summary = defaultdict(lambda: defaultdict(lambda: 0))
+    summary.update(summary_resp)
+    count = summary["counts"]["specimens"]
+
+    if count == 0:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Page failed to load, please try again",
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Institution {name} not found",
         )
 
+    stats = {
+        "specimens": summary["counts"]["specimens"],
+        "sequences": sum(summary["marker_code"].values()),
+        "records_w_bins": sum(summary["bin_uri"].values()),
+        "records_w_species": sum(summary["species"].values()),
+        "bins": len(summary["bin_uri"]),
+        "species": len(summary["species"]),
+        "institutions": len(summary["inst"]),
+    }
+
+    summary_as_seq_site = defaultdict(lambda: defaultdict(lambda: 0))
+    summary_as_seq_site.update(summary_as_seq_site_resp)
+
+    stats_as_seq_site = {
+        "sequences": sum(summary_as_seq_site["marker_code"].values()),
+    }
+
+    query_id = query_resp["query_id"]
+    extent_limit = query_resp["extent_limit"]
+    triplets = get_triplets_from_query_id(query_id)
+
+    urls.append(generate_api_url(f"/images/{query_id}"))
+
+    image_count = None
+    if image_response is not None:
+        image_count = 0
+        for images in image_response["images"].values():
+            image_count += len(images)
+
     return templates.TemplateResponse(
         "inst.jinja2",
         {
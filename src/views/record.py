@@ -1,15 +1,61 @@
 from fastapi import APIRouter, Request, Path, Query, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse
+import asyncio
 
-from views import templates
+from views import templates, fetch_optional_page_data, fetch_page_data, generate_api_url
 
-import httpx
 from collections import defaultdict
-from util import get_app_url
+from services.ancillary import get_ancillary_documents
+from services.documents import get_documents, get_record_documents
+from services.images import summarize_images, summarize_record_images
+from services.query import run_query
+from services.summary import summarize_query
 
 route = APIRouter(tags=["views"])
 
 
+_NO_IMAGES = {"images": {}, "photographers": {}}
+
+
+async def _query_record(processid, extent, urls):
+    query = f"ids:processid:{processid}"
+
+    summary_params = {
+        "query": query,
+        "fields": ",".join(["marker_code"]),
+    }
+    query_params = {"query": query, "extent": extent}
+    summary_resp, query_resp = await asyncio.gather(
+        fetch_page_data(summarize_query(**summary_params)),
+        fetch_page_data(run_query(**query_params)),
+    )
+    urls.append(generate_api_url("/summary", summary_params))
+    urls.append(generate_api_url("/query", query_params))
+    summary = defaultdict(lambda: defaultdict(lambda: 0))
+    summary.update(summary_resp)
+    count = sum(summary["marker_code"].values())
+
+    if count == 0:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Record {processid} not found",
+        )
+
+    query_id = query_resp["query_id"]
+
+    # Images are not required to render the page, so it is rendered without them if slow
+    documents_params = {"length": count}
+    results, image_data = await asyncio.gather(
+        fetch_page_data(run_in_threadpool(get_documents, query_id, **documents_params)),
+        fetch_optional_page_data(summarize_images(query_id), default=_NO_IMAGES),
+    )
+    urls.append(generate_api_url(f"/documents/{query_id}", documents_params))
+    records = results["data"]
+
+    return query_id, records, image_data
+
+
 @route.get("/record/{processid}", response_class=HTMLResponse)
 async def show_record(
     request: Request,
@@ -17,69 +63,36 @@ async def show_record(
     extent: str = Query("limited", title="Document extent"),
 ):
     urls = [request.url]
-    try:
-        async with httpx.AsyncClient(timeout=None) as client:
-            query = f"ids:processid:{processid}"
-
-            params = {
-                "query": query,
-                "fields": ",".join(["marker_code"]),
-            }
-            resp = await client.get(url=f"{get_app_url()}/api/summary", params=params)
-            resp.raise_for_status()
-            urls.append(resp.url)
-            summary = defaultdict(lambda: defaultdict(lambda: 0))
-            summary.update(resp.json())
-            count = sum(summary["marker_code"].values())
-
-            if count == 0:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Record {processid} not found",
-                )
-
-            params = {"query": query, "extent": extent}
-            resp = await client.get(url=f"{get_app_url()}/api/query", params=params)
-            resp.raise_for_status()
-            urls.append(resp.url)
-            query_resp = resp.json()
-            query_id = query_resp["query_id"]
-
-            resp = await client.get(
-                url=f"{get_app_url()}/api/documents/{query_id}",
-                params={"length": count},
-            )
-            resp.raise_for_status()
-            results = resp.json()
-            urls.append(resp.url)
-            records = results["data"]
-
-            resp = await client.get(
-                url=f"{get_app_url()}/api/images/{query_id}",
-            )
-            resp.raise_for_status()
-            image_data = resp.json()
-
-            dataset_data = {}
-            if recordset_codes := records[0].get("bold_recordset_code_arr", []):
-                params = {
-                    "collection": "datasets",
-                    "key": "dataset.code",
-                    "values": ";".join(recordset_codes),
-                }
-                resp = await client.get(
-                    url=f"{get_app_url()}/api/ancillary", params=params
-                )
-                resp.raise_for_status()
-                datasets = resp.json()
-                for document in datasets:
-                    dataset_data[document["dataset.code"]] = document
-
-    except httpx.HTTPStatusError:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Page failed to load, please try again",
+
+    # Records are fetched by key through the processid index, querying primary data
+    # only for processids the ETL has not indexed yet or whose index entry is stale
+    record_resp = await fetch_page_data(get_record_documents(processid, extent))
+    if record_resp is not None:
+        query_id = record_resp["query_id"]
+        records = record_resp["data"]
+        urls.append(
+            generate_api_url(f"/documents/{query_id}", {"length": len(records)})
+        )
+
+        image_data = await fetch_optional_page_data(
+            summarize_record_images(records), default=_NO_IMAGES
+        )
+        urls.append(generate_api_url(f"/images/{query_id}"))
+    else:
+        query_id, records, image_data = await _query_record(processid, extent, urls)
+
+    dataset_data = {}
+    if recordset_codes := records[0].get("bold_recordset_code_arr", []):
+        params = {
+            "collection": "datasets",
+            "key": "dataset.code",
+            "values": ";".join(recordset_codes),
+        }
+        datasets = await fetch_optional_page_data(
+            get_ancillary_documents(**params), default=[]
         )
+        for document in datasets:
+            dataset_data[document["dataset.code"]] = document
 
     return templates.TemplateResponse(
         "record.jinja2",